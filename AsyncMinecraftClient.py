@@ -0,0 +1,184 @@
+from twisted.internet import asyncioreactor
+import asyncio
+import sys
+
+
+def install_reactor(loop: asyncio.AbstractEventLoop = None):
+    """
+    Makes Twisted run on an asyncio event loop (the running one by default) instead of its own thread.
+    It must happen before anything imports twisted.internet.reactor, which quarry and MinecraftQuarryClient do
+    :return: the reactor
+    """
+    if 'twisted.internet.reactor' not in sys.modules:
+        asyncioreactor.install(loop or asyncio.get_running_loop())
+
+    from twisted.internet import reactor
+    if not isinstance(reactor, asyncioreactor.AsyncioSelectorReactor):
+        raise RuntimeError("Another Twisted reactor is already installed, create the first AsyncMinecraftClient "
+                           "before importing MinecraftQuarryClient or quarry")
+
+    if not reactor.running:
+        # The asyncio loop is already running, so only the reactor startup is left
+        reactor.startRunning(installSignalHandlers=False)
+
+    return reactor
+
+
+class AsyncMinecraftClient:
+    """
+    asyncio facade of MinecraftQuarryClient, the network runs on the event loop of the caller,
+    so many bots and other coroutines share a single thread. Must be created from a coroutine
+    """
+
+    def __init__(self,
+                 username: str,
+                 email: str = "",
+                 password: str = "",
+                 humanized: bool = True,
+                 debug: bool = False):
+
+        self.loop = asyncio.get_running_loop()
+        install_reactor(self.loop)
+
+        # Imported once the asyncio reactor is installed
+        from MinecraftQuarryClient import MinecraftQuarryClient
+
+        self.client = MinecraftQuarryClient(username, email, password, humanized, debug)
+
+    @property
+    def player(self):
+        return self.client.player
+
+    @property
+    def world(self):
+        return self.client.world
+
+    def _confirmation(self, event):
+        try:
+            return getattr(self.client.confirmations, event)
+        except AttributeError:
+            raise ValueError(f"Unknown event {event!r}") from None
+
+    def wait_for(self, event: str, predicate=None, timeout: float = None):
+        """
+        Waits for the next event (the name of an _on_ method without the prefix) whose arguments
+        satisfy predicate. The wait starts when this is called, not when awaited, so it can be
+        created before sending the packets it waits the answer of
+        :param predicate: function called with the arguments of the event
+        :param timeout: seconds before raising asyncio.TimeoutError
+        :return: awaitable of the tuple of arguments of the event
+        """
+        confirmation = self._confirmation(event)
+        future = self.loop.create_future()
+
+        def listener(args, kwargs):
+            if not future.done() and (predicate is None or predicate(*args, **kwargs)):
+                future.set_result(args)
+
+        confirmation.add_listener(listener)
+        future.add_done_callback(lambda _: confirmation.remove_listener(listener))
+
+        if timeout is not None:
+            return asyncio.wait_for(future, timeout)
+
+        return future
+
+    async def events(self, event: str, predicate=None):
+        """
+        Async iterator over the arguments of every event (the name of an _on_ method without
+        the prefix) whose arguments satisfy predicate, stops listening when the loop is left
+        """
+        confirmation = self._confirmation(event)
+        queue = asyncio.Queue()
+
+        def listener(args, kwargs):
+            if predicate is None or predicate(*args, **kwargs):
+                queue.put_nowait(args)
+
+        confirmation.add_listener(listener)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            confirmation.remove_listener(listener)
+
+    async def join(self, address: str, port: int = 25565, timeout: float = 30):
+        """
+        Joins a minecraft world, returns once the player has a position
+        :param timeout: seconds the whole login may take before raising TimeoutError
+        """
+        client = self.client
+        deadline = self.loop.time() + timeout
+
+        client._login_error = None
+        for event in (client._protocol_built, client._play_mode, client._position_loaded):
+            event.clear()
+
+        if not client._profile_loaded.is_set():
+            try:
+                await asyncio.wait_for(client._profile_request.asFuture(self.loop), timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError("Timed out joining the server while waiting for the account profile") from None
+
+        if client._login_error is not None:
+            raise ConnectionError(f"Couldn't join the server: {client._login_error}")
+
+        position_loaded = self.wait_for('player_position_and_look')
+        connection_failed = self.wait_for('connection_failed')
+
+        # Already on the reactor thread, which is this one
+        client.factory.connect(address, port)
+
+        done, _ = await asyncio.wait((position_loaded, connection_failed),
+                                     timeout=max(deadline - self.loop.time(), 0),
+                                     return_when=asyncio.FIRST_COMPLETED)
+        position_loaded.cancel()
+        connection_failed.cancel()
+
+        if connection_failed in done:
+            raise ConnectionError(f"Couldn't join the server: {connection_failed.result()[0]}")
+
+        if position_loaded not in done:
+            raise TimeoutError("Timed out joining the server while waiting for the player position")
+
+    async def break_block(self, x, y, z, face="top", ticks=0, timeout: float = 5):
+        """
+        Digs a block for some ticks, then waits for the server to change it
+        :param timeout: seconds to wait for the block change, None to return without waiting
+        :return: new block state id of the block, None when not waited
+        """
+        changed = None
+        if timeout is not None:
+            changed = self.wait_for('block_change', lambda bx, by, bz, block_id: (bx, by, bz) == (x, y, z), timeout)
+
+        self.client.start_breaking_block(x, y, z, face)
+        if ticks:
+            await asyncio.sleep(self.client.world.seconds_per_tick * ticks)
+        self.client.stop_breaking_block(x, y, z, face)
+
+        if changed is not None:
+            return (await changed)[3]
+
+    async def move_to(self, x, y, z, timeout: float = None, **kwargs):
+        """
+        Walks a path from the pathfinder, one block per tick
+        :return: False if no path was found
+        """
+        path = self.client.find_path(x, y, z, **kwargs)
+        if path is None:
+            return False
+
+        async def walk():
+            for position in path[1:]:
+                self.client.set_player_position(position[0] + 0.5, position[1], position[2] + 0.5, True)
+                await asyncio.sleep(self.client.world.seconds_per_tick)
+
+        await asyncio.wait_for(walk(), timeout)
+        return True
+
+    def __getattr__(self, item):
+        if item == 'client':
+            raise AttributeError(item)
+
+        # Everything that doesn't wait (sending chat, placing blocks, reading the world...) is the client's own
+        return getattr(self.client, item)
@@ -2,33 +2,240 @@ from twisted.internet import reactor
 from quarry.net.client import ClientProtocol, ClientFactory
 from quarry.net.auth import OfflineProfile, Profile
 from quarry.types.buffer import Buffer1_14
-from QuarryPlayer import Player, World, Entity, BlockFace, Hand, DiggingStatus, Confirmations, thread, InteractionType
-from bitstring import BitStream
+from quarry.data import packets
+from QuarryPlayer import Player, World, Entity, BlockFace, Hand, DiggingStatus, Confirmations, thread, InteractionType,\
+    unpack_varints
+from QuarryPathfinder import Pathfinder
+from QuarryBlocks import BlockRegistry
+from QuarryPackets import PacketEncoder
+from threading import Thread, Event, Lock
+import numpy as np
+import struct
+import math
 import time
 
+_reactor_thread: Thread = None
+_reactor_lock = Lock()
+
+
+def start_reactor():
+    """
+    Runs the reactor, which does all the network operations, in a background
+    thread shared by every client of the process. Does nothing if it already runs
+    """
+    global _reactor_thread
+
+    with _reactor_lock:
+        if _reactor_thread is None and not reactor.running:
+            _reactor_thread = Thread(target=reactor.run, args=(False,))
+            _reactor_thread.start()
+
+
+# Family -> packets that only update the client's state, which can be skipped when the family isn't
+# tracked. Packets the client must answer (keep alive, teleports, held item, transactions...) are never skipped
+PACKET_FAMILIES = {
+    'entities': ('spawn_player', 'entity_teleport', 'entity_look', 'entity_look_and_relative_move',
+                 'entity_relative_move'),
+    'blocks': ('chunk_data', 'unload_chunk', 'block_change', 'multi_block_change', 'block_break_animation',
+               'acknowledge_player_digging', 'block_metadata_response'),
+    'windows': ('open_window', 'close_window', 'window_property', 'window_items', 'set_slot'),
+    'titles': ('set_title_text', 'set_title_subtitle', 'set_title_time'),
+    'chat': ('chat_message', 'tab_complete'),
+    'time': ('time_update',),
+}
+
+
+class PacketCounters:
+    """
+    Packets and bytes a client has received and sent, only updated by the reactor thread
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.packets_received = 0
+        self.bytes_received = 0
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        # Packet name -> packets received
+        self.received = {}
+        # Packet name -> packets discarded without decoding, untracked or without handler
+        self.skipped = {}
+        self.unhandled = {}
+
+        # Send queue only
+        self.packets_coalesced = 0
+        self.bytes_saved = 0
+        self.writes = 0
+
+    def sample(self):
+        """
+        :return: dict of the totals and the time they were taken at
+        """
+        return dict(time=time.monotonic(),
+                    packets_received=self.packets_received,
+                    bytes_received=self.bytes_received,
+                    packets_sent=self.packets_sent,
+                    bytes_sent=self.bytes_sent)
+
+    def report(self):
+        """
+        :return: dict of packet name -> dict of the packets decoded, skipped because
+        untracked and unhandled, most received first, with the sums under 'total'
+        """
+        packets = {}
+        for name, received in sorted(self.received.items(), key=lambda item: -item[1]):
+            skipped, unhandled = self.skipped.get(name, 0), self.unhandled.get(name, 0)
+            packets[name] = dict(decoded=received - skipped - unhandled, skipped=skipped, unhandled=unhandled)
+
+        total = {key: sum(counts[key] for counts in packets.values()) for key in ('decoded', 'skipped', 'unhandled')}
+        return dict(packets=packets, total=total)
+
+
+# Movement packet -> (struct, fields), each one supersedes the fields it has of the previous ones
+_MOVEMENT_PACKETS = {
+    'player': (struct.Struct('>?'), ('on_ground',)),
+    'player_position': (struct.Struct('>ddd?'), ('x', 'y', 'z', 'on_ground')),
+    'player_look': (struct.Struct('>ff?'), ('yaw', 'pitch', 'on_ground')),
+    'player_position_and_look': (struct.Struct('>dddff?'), ('x', 'y', 'z', 'yaw', 'pitch', 'on_ground')),
+}
+
+
+class SendQueue:
+    """
+    Packets sent during a tick, flushed by the protocol in a single transport write. Consecutive
+    movement packets are merged into one, other packets keep their order around them
+    """
+
+    def __init__(self, counters: PacketCounters):
+        self.counters = counters
+        # (name, data, movement fields or None)
+        self.packets = []
+        self.lock = Lock()
+
+    def add(self, name, data):
+        fields = None
+        if name in _MOVEMENT_PACKETS:
+            packet_struct, names = _MOVEMENT_PACKETS[name]
+            fields = dict(zip(names, packet_struct.unpack(data)))
+
+        with self.lock:
+            if fields is not None and self.packets and self.packets[-1][2] is not None:
+                _, previous_data, previous_fields = self.packets[-1]
+                fields = dict(previous_fields, **fields)
+                name, merged = self._movement_packet(fields)
+
+                self.counters.packets_coalesced += 1
+                self.counters.bytes_saved += len(previous_data) + len(data) - len(merged)
+                self.packets[-1] = (name, merged, fields)
+            else:
+                self.packets.append((name, data, fields))
+
+    @staticmethod
+    def _movement_packet(fields):
+        if 'x' in fields:
+            name = 'player_position_and_look' if 'yaw' in fields else 'player_position'
+        else:
+            name = 'player_look' if 'yaw' in fields else 'player'
+
+        packet_struct, names = _MOVEMENT_PACKETS[name]
+        return name, packet_struct.pack(*(fields[field] for field in names))
+
+    def take(self):
+        with self.lock:
+            packets, self.packets = self.packets, []
+        return packets
+
 
 class MinecraftQuarryClientFactory(ClientFactory):
 
     def buildProtocol(self, addr):
-        self.quarry_protocol = self.protocol(self, addr)
+        self.quarry_protocol = self.protocol(self, addr, quarry_client=self.quarry_client)
+        self.quarry_client._protocol_built.set()
         return self.quarry_protocol
 
+    def clientConnectionFailed(self, connector, reason):
+        self.quarry_client._on_connection_failed(reason.getErrorMessage())
+
+    def clientConnectionLost(self, connector, reason):
+        self.quarry_client._on_connection_failed(reason.getErrorMessage())
+
     def __init__(self, *args, quarry_client, quarry_protocol=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.quarry_protocol: MinecraftQuarryClientProtocol = quarry_protocol
         self.quarry_client: MinecraftQuarryClient = quarry_client
-        self.protocol.quarry_client = self.quarry_client
 
 
 class MinecraftQuarryClientProtocol(ClientProtocol):
     def send_packet(self, name, *data):
-        super().send_packet(name, *data)
+        counters = self.quarry_client.packet_counters
+        counters.packets_sent += 1
+        counters.bytes_sent += sum(map(len, data))
+
+        if self.protocol_mode != 'play':
+            super().send_packet(name, *data)
+        elif self.send_queue is not None:
+            self.send_queue.add(name, b''.join(data))
+        elif not self.closed:
+            # Same steps as quarry 1.9.6's Protocol.send_packet (closed check, log_packet, id, framing,
+            # compression, encryption) with the id and framing of PacketEncoder, keep them in sync with quarry
+            self.log_packet("# send", name)
+            self.transport.write(self.cipher.encrypt(
+                self.encoder.frame(name, b''.join(data), self.compression_threshold)))
+
+    def flush_send_queue(self):
+        """
+        Writes the packets queued during the tick, called every tick by the ticker
+        """
+        packets = self.send_queue.take()
+        if not packets or self.closed:
+            return
+
+        encoder = self.encoder
+        data = b''.join(encoder.frame(name, payload, self.compression_threshold) for name, payload, _ in packets)
+        self.transport.write(self.cipher.encrypt(data))
+        self.quarry_client.packet_counters.writes += 1
+
+    @property
+    def encoder(self):
+        """
+        Packet encoder of the protocol version, which is only known once connected
+        """
+        if self._encoder is None or self._encoder.protocol_version != self.protocol_version:
+            self._encoder = PacketEncoder.get(self.protocol_version)
+        return self._encoder
+
+    def data_received(self, data):
+        self.quarry_client.packet_counters.bytes_received += len(data)
+        super().data_received(data)
+
+    def packet_received(self, buff, name):
+        counters = self.quarry_client.packet_counters
+        counters.packets_received += 1
+        counters.received[name] = counters.received.get(name, 0) + 1
+
+        recorder = self.quarry_client.packet_recorder
+        if recorder is not None:
+            recorder.record(self.protocol_version, self.protocol_mode, name, buff.buff[buff.pos:])
+
+        if name in self.quarry_client.skipped_packets:
+            counters.skipped[name] = counters.skipped.get(name, 0) + 1
+            buff.discard()
+            return
+
+        super().packet_received(buff, name)
 
     def __init__(self, *args, quarry_client=None, **kwargs):
         super(MinecraftQuarryClientProtocol, self).__init__(*args, **kwargs)
         if quarry_client:
             self.quarry_client: MinecraftQuarryClient = quarry_client
 
+        self._encoder: PacketEncoder = None
+
+        self.send_queue: SendQueue = None
+        if quarry_client and quarry_client.batch_packets:
+            self.send_queue = SendQueue(quarry_client.packet_counters)
+            self.ticker.add_loop(1, self.flush_send_queue)
+
     def packet_login_disconnect(self, buff: Buffer1_14):
         super(MinecraftQuarryClientProtocol, self).packet_login_disconnect(buff)
         buff.restore()
@@ -91,21 +298,25 @@ class MinecraftQuarryClientProtocol(ClientProtocol):
         self.quarry_client._on_tab_complete(_id, start, length, matches)
 
     def packet_multi_block_change(self, buff: Buffer1_14):
-        chunk_section_position_stream = BitStream(buff.read(8))
-        chunk_x, chunk_z, chunk_y = (
-            chunk_section_position_stream.read(22).int,
-            chunk_section_position_stream.read(22).int,
-            chunk_section_position_stream.read(20).int
-        )
+        # Section position is a long made of x (22 bits), z (22 bits) and y (20 bits), all signed
+        chunk_section_position = buff.unpack('q')
+        chunk_x = chunk_section_position >> 42
+        chunk_z = ((chunk_section_position >> 20) & 0x3FFFFF) - (((chunk_section_position >> 20) & 0x200000) << 1)
+        chunk_y = (chunk_section_position & 0xFFFFF) - ((chunk_section_position & 0x80000) << 1)
+
         buff.unpack('?')
         blocks_array_size = buff.unpack_varint()
-        blocks = []
-        for _ in range(blocks_array_size):
-            block_varlong = BitStream('0b' + bin(buff.unpack_varint(max_bits=64))[2:].rjust(64, '0'))
-            block_state_id = block_varlong.read(block_varlong.length - 12).uint
-            x, z, y = block_varlong.read(4).uint, block_varlong.read(4).uint, block_varlong.read(4).uint
-            blocks.append((block_state_id, (x, y, z)))
-            
+
+        # Each record is a varlong of block_state_id << 12 | x << 8 | z << 4 | y
+        records, buff.pos = unpack_varints(buff.buff, buff.pos, blocks_array_size, max_bytes=10)
+        records = np.asarray(records, dtype='int64')
+
+        blocks = np.empty((blocks_array_size, 4), dtype='int32')
+        blocks[:, 0] = records >> 12
+        blocks[:, 1] = (records >> 8) & 15
+        blocks[:, 2] = records & 15
+        blocks[:, 3] = (records >> 4) & 15
+
         self.quarry_client._on_multi_block_change(chunk_x, chunk_y, chunk_z, blocks)
 
     def packet_block_change(self, buff: Buffer1_14):
@@ -123,6 +334,11 @@ class MinecraftQuarryClientProtocol(ClientProtocol):
     def packet_chunk_data(self, buff: Buffer1_14):
         self.quarry_client.world.chunks.new_chunk_data(buff.read())
 
+    def packet_unload_chunk(self, buff: Buffer1_14):
+        chunk_x, chunk_z = buff.unpack('ii')
+
+        self.quarry_client._on_unload_chunk(chunk_x, chunk_z)
+
     def packet_confirm_transaction(self, buff: Buffer1_14):
         #  before and including 1.16.5
         #  self.protocol_version < 755 -> True
@@ -227,12 +443,7 @@ class MinecraftQuarryClientProtocol(ClientProtocol):
         self.quarry_client._set_title_time(fade_in, stay, fade_out)
 
     def send_held_item_change(self, slot):
-        buff = Buffer1_14()
-        buff.add(buff.pack('h', slot))
-
-        #self.send_client_settings()
-        #self.send_plugin_message()
-        self.send_packet('held_item_change', buff.read())
+        self.send_packet('held_item_change', self.encoder.held_item_change(slot))
 
     def packet_held_item_change(self, buff: Buffer1_14):
         slot = buff.unpack('B')
@@ -281,24 +492,18 @@ class MinecraftQuarryClientProtocol(ClientProtocol):
         self.quarry_client.set_player_position_and_rotation(x, y, z, yaw, pitch)
 
     def set_player_position_and_rotation(self, x, y, z, yaw, pitch, on_ground=True):
-        buff = Buffer1_14()
-        buff.add(buff.pack('dddffB', x, y, z, yaw, pitch, on_ground))
-        self.send_packet('player_position_and_look', buff.read())
+        self.send_packet('player_position_and_look', self.encoder.player_position_and_look(x, y, z, yaw, pitch, on_ground))
 
     def set_player_position(self, x, y, z, on_ground=True):
-        buff = Buffer1_14()
-        #print(x, y, z)
-        buff.add(buff.pack('dddB', x, y, z, on_ground))
-
-        self.send_packet('player_position', buff.read())
+        self.send_packet('player_position', self.encoder.player_position(x, y, z, on_ground))
 
     def teleport_confirm(self, teleport_id):
-        buff = Buffer1_14()
-        buff.add(buff.pack_varint(teleport_id))
-
-        self.send_packet('teleport_confirm', buff.read())
+        self.send_packet('teleport_confirm', self.encoder.varints(teleport_id))
 
     def packet_unhandled(self, buff, name):
+        counters = self.quarry_client.packet_counters
+        counters.unhandled[name] = counters.unhandled.get(name, 0) + 1
+
         if self.quarry_client.debug:
             print(f"[{name}] UNHANDLED: {buff.read()}")
             return
@@ -329,9 +534,6 @@ class MinecraftQuarryClientProtocol(ClientProtocol):
         self.switch_protocol_mode("play")
         self.player_joined()
 
-        while not self.protocol_mode == "play":
-            continue
-
         self.quarry_client.player.UUID = p_uuid
         self.quarry_client.player.display_name = p_display_name
 
@@ -341,23 +543,14 @@ class MinecraftQuarryClientProtocol(ClientProtocol):
     def use_item(self, hand: Hand = 0):
         if type(hand) is not int:
             hand = hand.value
-        buff = Buffer1_14()
-        buff.add(buff.pack_varint(hand))
 
-        self.send_packet('use_item', buff.read())
+        self.send_packet('use_item', self.encoder.varints(hand))
 
     def send_chat_message(self, message):
-        buff = Buffer1_14()
-        buff.add(buff.pack_string(message))
-
-        self.send_packet('chat_message', buff.read())
+        self.send_packet('chat_message', self.encoder.string(message))
 
     def swap_hands(self):
-        buff = Buffer1_14()
-        buff.add(buff.pack_varint(DiggingStatus.SWAP_ITEM.value))
-        buff.add(buff.pack_position(0, 0, 0))
-        buff.add(buff.pack('B', 0))
-        self.send_packet('player_digging', buff.read())
+        self.send_packet('player_digging', self.encoder.player_digging(DiggingStatus.SWAP_ITEM.value))
 
     def packet_keep_alive(self, buff: Buffer1_14):
         self.send_packet('keep_alive', buff.read())
@@ -419,18 +612,10 @@ class MinecraftQuarryClientProtocol(ClientProtocol):
         self.quarry_client.on_player_left()
 
     def respawn(self):
-        buff = Buffer1_14()
-        buff.add(buff.pack_varint(0))
-
-        self.send_packet('client_status', buff.read())
+        self.send_packet('client_status', self.encoder.varints(0))
 
     def send_nbt_query(self, transaction_id, x, y, z):
-        buff = Buffer1_14()
-
-        buff.add(buff.pack_varint(transaction_id))
-        buff.add(buff.pack_position(x, y, z))
-
-        self.send_packet('query_block_nbt', buff.read())
+        self.send_packet('query_block_nbt', self.encoder.varint_and_position(transaction_id, x, y, z))
 
     def packet_update_health(self, buff):
         health = buff.unpack('f')
@@ -440,28 +625,13 @@ class MinecraftQuarryClientProtocol(ClientProtocol):
         self.quarry_client._on_update_health(health, food, food_saturation)
 
     def update_held_item(self):
-        buff = Buffer1_14()
-        buff.add(buff.pack_varint(DiggingStatus.SHOOT_ARROW.value))
-        buff.add(buff.pack_position(0, 0, 0))
-        buff.add(buff.pack('B', 0))
-
-        self.send_packet('player_digging', buff.read())
+        self.send_packet('player_digging', self.encoder.player_digging(DiggingStatus.SHOOT_ARROW.value))
 
     def drop_item(self):
-        buff = Buffer1_14()
-        buff.add(buff.pack_varint(DiggingStatus.DROP_ITEM.value))
-        buff.add(buff.pack_position(0, 0, 0))
-        buff.add(buff.pack('B', 0))
-
-        self.send_packet('player_digging', buff.read())
+        self.send_packet('player_digging', self.encoder.player_digging(DiggingStatus.DROP_ITEM.value))
 
     def drop_stack(self):
-        buff = Buffer1_14()
-        buff.add(buff.pack_varint(DiggingStatus.DROP_ITEM_STACK.value))
-        buff.add(buff.pack_position(0, 0, 0))
-        buff.add(buff.pack('B', 0))
-
-        self.send_packet('player_digging', buff.read())
+        self.send_packet('player_digging', self.encoder.player_digging(DiggingStatus.DROP_ITEM_STACK.value))
 
     def packet_chat_message(self, buff: Buffer1_14):
         message_object = buff.unpack_chat()
@@ -483,10 +653,7 @@ class MinecraftQuarryClientProtocol(ClientProtocol):
          self.quarry_client.on_game_info_message][position](string_message, sender, message_object)
 
     def send_close_window(self, window_id):
-        buff = Buffer1_14()
-        buff.add(buff.pack('B', window_id))
-
-        self.send_packet('close_window', buff.read())
+        self.send_packet('close_window', self.encoder.close_window(window_id))
 
     def send_click_window(self,
                           slot_number,
@@ -501,100 +668,46 @@ class MinecraftQuarryClientProtocol(ClientProtocol):
         if new_slot_data_array is None:
             new_slot_data_array = [(slot_number, {'item': None})]
 
-        buff = Buffer1_14()
-        buff.add(
-            buff.pack('B', window_id or self.quarry_client.player.inventory.window.id or 0) +
-
-            [b'', buff.pack_varint(state_id or getattr(self.quarry_client.player.inventory, 'state_id', 1) or 1)]\
-                [self.protocol_version >= 755] +
-
-            buff.pack('h', slot_number) +
-
-            buff.pack('b', button) +
-
-            [b'', buff.pack('h', action_id or getattr(self.quarry_client.player.inventory.window, 'action_id', 1) or 1)]\
-                [self.protocol_version < 755] +
-
-            buff.pack_varint(mode))
-
-        if self.protocol_version >= 755:
-            buff.add(
-                buff.pack_varint(len(new_slot_data_array)) +
-                b''.join([buff.pack('h', _slot) + buff.pack_slot(**_slot_data) for _slot, _slot_data in new_slot_data_array]))
-
-        buff.add(buff.pack_slot(**slot_data))
-
-        self.send_packet('click_window', buff.read())
+        inventory = self.quarry_client.player.inventory
+        self.send_packet('click_window', self.encoder.click_window(
+            window_id or inventory.window.id or 0,
+            slot_number,
+            button,
+            mode,
+            state_id or getattr(inventory, 'state_id', 1) or 1,
+            action_id or getattr(inventory.window, 'action_id', 1) or 1,
+            slot_data,
+            new_slot_data_array))
 
     def send_start_breaking(self, x, y, z, face):
-        buff = Buffer1_14()
-        buff.add(buff.pack_varint(DiggingStatus.START_DIGGING.value))
-        buff.add(buff.pack_position(x, y, z))
-        buff.add(buff.pack('B', face))
-
-        self.send_packet('player_digging', buff.read())
+        self.send_packet('player_digging', self.encoder.player_digging(DiggingStatus.START_DIGGING.value, x, y, z, face))
 
     def send_stop_breaking(self, x, y, z, face, operation="break"):
         status = {
             'cancel': DiggingStatus.CANCEL_DIGGING,
             'break': DiggingStatus.FINISH_DIGGING
         }.get(operation, DiggingStatus.FINISH_DIGGING)
-        buff = Buffer1_14()
-        buff.add(buff.pack_varint(status.value))
-        buff.add(buff.pack_position(x, y, z))
-        buff.add(buff.pack('B', face))
 
-        self.send_packet('player_digging', buff.read())
+        self.send_packet('player_digging', self.encoder.player_digging(status.value, x, y, z, face))
 
     def send_player_block_placement(self, hand, x, y, z, face, cursor_x, cursor_y, cursor_z, inside_block=False):
-        buff = Buffer1_14()
-        buff.add(
-            buff.pack_varint(hand) +
-            buff.pack_position(int(x), int(y), int(z)) +
-            buff.pack_varint(face) +
-            buff.pack('fff', cursor_x, cursor_y, cursor_z) +
-            buff.pack('?', inside_block))
-
-        self.send_packet('player_block_placement', buff.read())
+        self.send_packet('player_block_placement', self.encoder.player_block_placement(
+            hand, int(x), int(y), int(z), face, cursor_x, cursor_y, cursor_z, inside_block))
 
     def send_window_confirm(self, *args, **kwargs):
         self.send_confirm_transaction(*args, **kwargs)
 
     def send_entity_action(self, entity_id, action_id, jump_boost: int = 0):
-        buff = Buffer1_14()
-        buff.add(
-            buff.pack_varint(entity_id) +
-            buff.pack_varint(action_id) +
-            buff.pack_varint(jump_boost)
-        )
-
-        self.send_packet('entity_action', buff.read())
+        self.send_packet('entity_action', self.encoder.varints(entity_id, action_id, jump_boost))
 
     def send_confirm_transaction(self, window_id, action_number, accepted):
-        buff = Buffer1_14()
-        buff.add(buff.pack('bh?', window_id, action_number, accepted))
-
-        self.send_packet('confirm_transaction', buff.read())
+        self.send_packet('confirm_transaction', self.encoder.confirm_transaction(window_id, action_number, accepted))
 
     def send_tab_complete(self, transaction_id, text):
-        buff = Buffer1_14()
-
-        buff.add(
-            buff.pack_varint(transaction_id) +
-            buff.pack_string(text)
-        )
-
-        self.send_packet('tab_complete', buff.read())
+        self.send_packet('tab_complete', self.encoder.varint_and_string(transaction_id, text))
 
     def send_block_metadata_request(self, transaction_id, location):
-        buff = Buffer1_14()
-
-        buff.add(
-            buff.pack_varint(transaction_id) +
-            buff.pack_position(*location)
-        )
-
-        self.send_packet('block_metadata_request', buff.read())
+        self.send_packet('block_metadata_request', self.encoder.varint_and_position(transaction_id, *location))
 
     def send_interact_entity(self,
                              entity_id,
@@ -608,15 +721,8 @@ class MinecraftQuarryClientProtocol(ClientProtocol):
         if type(action_type) is str:
             action_type: InteractionType = getattr(InteractionType, action_type, InteractionType.INTERACT)
 
-        buff = Buffer1_14()
-        buff.add(
-            buff.pack_varint(entity_id) +
-            buff.pack_varint(action_type.value) +
-            ((buff.pack('fff', target_x, target_y, target_z) + buff.pack_varint(int(hand))) if action_type == InteractionType.INTERACT_AT else b'') +
-            buff.pack('?', sneaking)
-        )
-
-        self.send_packet('use_entity', buff.read())
+        self.send_packet('use_entity', self.encoder.use_entity(
+            entity_id, action_type.value, target_x, target_y, target_z, int(hand), sneaking))
 
 
 class MinecraftQuarryClient:
@@ -635,14 +741,32 @@ class MinecraftQuarryClient:
         self.player.username = username
 
         self.world = World(self)
+        self.pathfinder = Pathfinder(self.world)
+        self.block_registry: BlockRegistry = None
 
         self.debug = debug
+        self.packet_counters = PacketCounters()
+        # Queue the packets of each tick and merge the movements, read when connecting
+        self.batch_packets = False
+        # Packets discarded as they arrive, set with track_packets
+        self.skipped_packets = frozenset()
+        # QuarryReplay.PacketRecorder writing every packet received
+        self.packet_recorder = None
+
+        # Login steps, set by the network thread as they happen
+        self._profile_loaded = Event()
+        self._protocol_built = Event()
+        self._play_mode = Event()
+        self._position_loaded = Event()
+        self._login_error = None
 
         if password:
             self.factory.profile = None
-            Profile.from_credentials(email, password).addCallback(self._set_factory_profile)
+            self._profile_request = Profile.from_credentials(email, password).addCallbacks(
+                self._set_factory_profile, self._on_profile_error)
         else:
             self.factory.profile = OfflineProfile(username)
+            self._profile_loaded.set()
 
     def _set_factory_profile(self, profile):
         """
@@ -651,38 +775,78 @@ class MinecraftQuarryClient:
         :param profile: Result of Profile.from_credentials(email, password)
         """
         self.factory.profile = profile
+        self._profile_loaded.set()
 
-    def join_server(self, address: str, port: int = 25565):
+    def _on_profile_error(self, failure):
+        self._on_connection_failed(f"Couldn't log in the account: {failure.getErrorMessage()}")
+
+    def _on_connection_failed(self, reason):
+        # Only matters while joining, wakes up join_server to raise it
+        if not self._position_loaded.is_set():
+            self._login_error = reason
+            for event in (self._profile_loaded, self._protocol_built, self._play_mode, self._position_loaded):
+                event.set()
+
+    def _wait_login_step(self, event: Event, deadline, step):
+        if not event.wait(max(deadline - time.monotonic(), 0)):
+            raise TimeoutError(f"Timed out joining the server while waiting for {step}")
+
+        if self._login_error is not None:
+            raise ConnectionError(f"Couldn't join the server while waiting for {step}: {self._login_error}")
+
+    def join_server(self, address: str, port: int = 25565, timeout: float = 30):
         """
-        Joins a minecraft world
+        Joins a minecraft world, waiting (without using the CPU) until the player has a position
         :param address: server address
         :param port: port to connect, minecraft default port is 25565
+        :param timeout: seconds the whole login may take before raising TimeoutError
         """
-        # Starting "reactor" which runs all networks operations
-        # starts in a different thread to be able to continue
-        # sending information in main thread
-        from threading import Thread
-        Thread(target=reactor.run, args=(False,)).start()
+        deadline = time.monotonic() + timeout
 
-        # Waiting for login process
-        while not self.factory.profile:
-            continue
+        self._reset_login()
+        start_reactor()
 
-        # Actually connects and "joins the server"
-        self.factory.connect(address, port)
+        self._wait_login_step(self._profile_loaded, deadline, "the account profile")
 
-        # Needed for bottom condition not to raise "'NoneType' has no 'protocol_mode'"
-        while type(self.factory.quarry_protocol) is type(None):
-            continue
+        # Actually connects and "joins the server", from the reactor thread
+        reactor.callFromThread(self.factory.connect, address, port)
 
-        # Waits for minecraft protocol to switch to "play" mode
-        # Waits for minecraft protocol to switch to "play" mode
-        while self.factory.quarry_protocol.protocol_mode != 'play':
-            continue
+        self._wait_login(deadline)
 
-        # Waits for player to load a position on the server
-        while all([getattr(self.player, attr) is None for attr in ['x', 'y', 'z', 'yaw', 'pitch']]):
-            continue
+    def _reset_login(self):
+        self._login_error = None
+        for event in (self._protocol_built, self._play_mode, self._position_loaded):
+            event.clear()
+
+    def _wait_login(self, deadline):
+        self._wait_login_step(self._protocol_built, deadline, "the connection")
+        self._wait_login_step(self._play_mode, deadline, "the play mode")
+        self._wait_login_step(self._position_loaded, deadline, "the player position")
+
+    def track_packets(self, families=None):
+        """
+        Chooses the packet families (see PACKET_FAMILIES) that are decoded, the packets of the others are
+        discarded unread: their _on_ / on_ methods aren't called and the state they update becomes stale
+        :param families: names of the tracked families, None to track everything
+        """
+        if families is None:
+            self.skipped_packets = frozenset()
+            return
+
+        families = {families} if type(families) is str else set(families)
+        unknown = families - PACKET_FAMILIES.keys()
+        if unknown:
+            raise ValueError(f"Unknown packet families {sorted(unknown)}, known ones are {sorted(PACKET_FAMILIES)}")
+
+        self.skipped_packets = frozenset(name for family, names in PACKET_FAMILIES.items()
+                                         if family not in families for name in names)
+
+    def disconnect(self):
+        """
+        Closes the connection to the server, if any
+        """
+        if self.factory.quarry_protocol is not None:
+            reactor.callFromThread(self.factory.quarry_protocol.close)
 
     def _on_set_slot(self, window_id, slot, slot_data, state_id=None):
 
@@ -694,7 +858,8 @@ class MinecraftQuarryClient:
             return
 
         self.player.inventory.window.id = window_id
-        self.player.inventory.slots[slot] = slot_data
+        with self.player.inventory.lock:
+            self.player.inventory.slots[slot] = slot_data
 
         self.on_set_slot(window_id, slot, slot_data, state_id)
 
@@ -702,6 +867,7 @@ class MinecraftQuarryClient:
         pass
 
     def _on_player_joined(self):
+        self._play_mode.set()
         return self.on_player_joined()
 
     def on_player_joined(self):
@@ -764,6 +930,7 @@ class MinecraftQuarryClient:
         self.player.z = z
         self.player.yaw = yaw
         self.player.pitch = pitch
+        self._position_loaded.set()
         return self.on_player_position_and_look(x, y, z, yaw, pitch, teleport_id, flags, dismount_vehicle)
 
     def on_player_position_and_look(self, x, y, z, yaw, pitch, teleport_id, flags, dismount_vehicle=False):
@@ -839,6 +1006,34 @@ class MinecraftQuarryClient:
             self.player.pitch + pitch,
             on_ground)
 
+    def load_block_registry(self, path, protocol_version=None, **kwargs):
+        """
+        Loads the block states of the protocol version in use (see BlockRegistry.load),
+        the world's air states and the pathfinder's tables are taken from it
+        :param path: data generator or minecraft-data blocks.json
+        :param protocol_version: the one negotiated with the server by default
+        """
+        if protocol_version is None:
+            protocol_version = getattr(self.factory.quarry_protocol, 'protocol_version', None) or \
+                               self.factory.force_protocol_version or packets.default_protocol_version
+
+        self.block_registry = BlockRegistry.load(path, protocol_version, **kwargs)
+
+        self.world.chunks.air_block_state_ids = set(np.flatnonzero(self.block_registry.air).tolist())
+        self.pathfinder.set_block_states(
+            np.flatnonzero(~self.block_registry.solid & ~self.block_registry.liquid),
+            self.block_registry.states('lava') if 'lava' in self.block_registry else ())
+
+        return self.block_registry
+
+    def find_path(self, x, y, z, **kwargs):
+        """
+        Path from the player's position to a block position, see Pathfinder.find_path
+        :return: list of (x, y, z) waypoints or None if it wasn't found
+        """
+        return self.pathfinder.find_path(
+            (math.floor(self.player.x), math.floor(self.player.y), math.floor(self.player.z)), (x, y, z), **kwargs)
+
     def _on_plugin_message(self, channel, data):
         self.on_plugin_message(channel, data)
 
@@ -885,8 +1080,8 @@ class MinecraftQuarryClient:
             on_ground)
 
     def _on_visible_player(self, entity_id, player_uuid, x, y, z, yaw, pitch):
-        self.world.entities_object.entities[entity_id] = Entity(self)
-        self.world.entities_object.entities[entity_id].update_option(
+        entity = Entity(self)
+        entity.update_option(
             entity_id=entity_id,
             UUID=player_uuid,
             x=x,
@@ -896,6 +1091,10 @@ class MinecraftQuarryClient:
             pitch=pitch,
             is_player=True)
 
+        # Only added once complete, readers never see a half built entity
+        with self.world.entities_object.lock:
+            self.world.entities_object.entities[entity_id] = entity
+
         self.on_visible_player(self.world.entities_object.entities[entity_id])
 
     def on_visible_player(self, entity: Entity):
@@ -920,14 +1119,15 @@ class MinecraftQuarryClient:
                                          pitch=None,
                                          on_ground=True):
         if entity_id in self.world.entities_object.entities:
-            self.world.entities_object.entities[entity_id].update_from_delta(
-                x=delta_x,
-                y=delta_y,
-                z=delta_z)
-            self.world.entities_object.entities[entity_id].update_option(
-                yaw=eval([f'{yaw} / 128 * 180', 'None'][yaw is None]),
-                pitch=eval([f'{pitch} / 64 * 90', 'None'][pitch is None]),
-                on_ground=on_ground)
+            with self.world.entities_object.lock:
+                self.world.entities_object.entities[entity_id].update_from_delta(
+                    x=delta_x,
+                    y=delta_y,
+                    z=delta_z)
+                self.world.entities_object.entities[entity_id].update_option(
+                    yaw=eval([f'{yaw} / 128 * 180', 'None'][yaw is None]),
+                    pitch=eval([f'{pitch} / 64 * 90', 'None'][pitch is None]),
+                    on_ground=on_ground)
 
             self.on_entity_position_and_rotation(
                 self.world.entities_object.entities[entity_id],
@@ -940,14 +1140,15 @@ class MinecraftQuarryClient:
 
     def _on_entity_teleport(self, entity_id, x, y, z, yaw, pitch, on_ground):
         if entity_id in self.world.entities_object.entities:
-            self.world.entities_object.entities[entity_id].update_option(
-                x=x,
-                y=y,
-                z=z,
-                yaw=yaw,
-                pitch=pitch,
-                on_ground=on_ground
-            )
+            with self.world.entities_object.lock:
+                self.world.entities_object.entities[entity_id].update_option(
+                    x=x,
+                    y=y,
+                    z=z,
+                    yaw=yaw,
+                    pitch=pitch,
+                    on_ground=on_ground
+                )
 
             self.on_entity_teleport(self.world.entities_object.entities[entity_id], x, y, z, yaw, pitch, on_ground)
 
@@ -1057,6 +1258,7 @@ class MinecraftQuarryClient:
 
     def _on_block_change(self, x, y, z, block_id):
         self.world.chunks.new_block_change(x, y, z, block_id)
+        self.pathfinder.invalidate_block(x, y, z)
         self.on_block_change(x, y, z, block_id)
 
     def on_block_change(self, x, y, z, block_id):
@@ -1155,6 +1357,7 @@ class MinecraftQuarryClient:
         self.player.inventory.window.id = 0
 
     def _on_kicked(self, reason):
+        self._on_connection_failed(f"Kicked: {reason}")
         self.on_kicked(reason)
 
     def on_kicked(self, reason):
@@ -1162,9 +1365,21 @@ class MinecraftQuarryClient:
 
     def _on_multi_block_change(self, chunk_x, chunk_y, chunk_z, blocks):
         self.world.chunks.new_multi_block_change(chunk_x, chunk_y, chunk_z, blocks)
+        self.pathfinder.invalidate_section(chunk_x, chunk_y, chunk_z)
         self.on_multi_block_change(chunk_x, chunk_y, chunk_z, blocks)
 
     def on_multi_block_change(self, chunk_x, chunk_y, chunk_z, blocks):
+        """
+        :param blocks: (N, 4) int32 array, each row is (block_state_id, x, y, z) relative to the chunk section
+        """
+        pass
+
+    def _on_unload_chunk(self, chunk_x, chunk_z):
+        self.world.chunks.remove_chunk(chunk_x, chunk_z)
+        self.pathfinder.forget_chunk(chunk_x, chunk_z)
+        self.on_chunk_unload(chunk_x, chunk_z)
+
+    def on_chunk_unload(self, chunk_x, chunk_z):
         pass
 
     def interact_with(self,
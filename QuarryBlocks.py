@@ -0,0 +1,316 @@
+from typing import Dict
+import numpy as np
+import tempfile
+import zipfile
+import hashlib
+import json
+import os
+
+
+AIR_BLOCKS = {'air', 'cave_air', 'void_air'}
+LIQUID_BLOCKS = {'water', 'lava', 'bubble_column'}
+
+
+def _block_name(name):
+    return name[10:] if name.startswith('minecraft:') else name
+
+
+def _properties_string(properties):
+    return ','.join(f'{key}={value}' for key, value in sorted(properties.items()))
+
+
+class BlockRegistry:
+    """
+    Block state ids of a protocol version compiled into flat NumPy tables, all the lookups
+    are indexing operations. Loaded from the blocks.json report of the vanilla data generator
+    (java -cp server.jar net.minecraft.data.Main --reports) or from minecraft-data's blocks.json,
+    which also has the hardness and collision of each block
+    """
+
+    # Bumped when the arrays saved in the cache change
+    CACHE_FORMAT = 1
+
+    def __init__(self,
+                 protocol_version,
+                 block_names,
+                 block_first_state,
+                 block_default_state,
+                 state_block,
+                 state_properties,
+                 hardness,
+                 solid):
+        """
+        :param block_names: (B,) names without namespace
+        :param block_first_state: (B,) first block state id of each block, states of a block are contiguous
+        :param block_default_state: (B,) default block state id of each block
+        :param state_block: (S,) block index of each block state id
+        :param state_properties: (S,) properties of each state as "key=value,..." sorted by key
+        :param hardness: (B,) hardness of each block, NaN when not known
+        :param solid: (S,) states with a full collision box
+        """
+        self.protocol_version = protocol_version
+
+        self.block_names = np.asarray(block_names, dtype='U')
+        self.block_first_state = np.asarray(block_first_state, dtype='int32')
+        self.block_default_state = np.asarray(block_default_state, dtype='int32')
+        self.state_block = np.asarray(state_block, dtype='int32')
+        self.state_properties = np.asarray(state_properties, dtype='U')
+        self.block_hardness = np.asarray(hardness, dtype='float32')
+
+        self.block_state_count = np.diff(np.append(self.block_first_state, len(self.state_block))).astype('int32')
+
+        # Per state flags
+        self.air = np.isin(self.block_names, list(AIR_BLOCKS))[self.state_block]
+        self.liquid = np.isin(self.block_names, list(LIQUID_BLOCKS))[self.state_block]
+        self.solid = np.asarray(solid, dtype='bool')
+        self.hardness = self.block_hardness[self.state_block]
+
+        self._block_indices: Dict[str, int] = {name: index for index, name in enumerate(self.block_names.tolist())}
+        self._states_by_properties: Dict[tuple, int] = None
+
+    def __len__(self):
+        return len(self.state_block)
+
+    def __contains__(self, name):
+        return _block_name(name) in self._block_indices
+
+    def _block_index(self, name):
+        try:
+            return self._block_indices[_block_name(name)]
+        except KeyError:
+            raise KeyError(f"Unknown block {name!r} for protocol {self.protocol_version}") from None
+
+    def name(self, block_state_id):
+        return str(self.block_names[self.state_block[block_state_id]])
+
+    def names(self, block_state_ids):
+        """
+        Vectorized name, works with any shape like Chunk.blocks
+        """
+        return self.block_names[self.state_block[np.asarray(block_state_ids)]]
+
+    def properties(self, block_state_id):
+        properties = str(self.state_properties[block_state_id])
+        return dict(item.split('=', 1) for item in properties.split(',')) if properties else {}
+
+    def states(self, name):
+        """
+        :return: range of the block state ids of a block
+        """
+        index = self._block_index(name)
+        first_state = int(self.block_first_state[index])
+        return range(first_state, first_state + int(self.block_state_count[index]))
+
+    def default_state(self, name):
+        return int(self.block_default_state[self._block_index(name)])
+
+    def state(self, name, **properties):
+        """
+        Block state id of a block with some properties, the properties that
+        are not given keep the value of the default state
+        """
+        default_state = self.default_state(name)
+        if not properties:
+            return default_state
+
+        if self._states_by_properties is None:
+            self._states_by_properties = {
+                (block_index, state_properties): state
+                for state, (block_index, state_properties) in
+                enumerate(zip(self.state_block.tolist(), self.state_properties.tolist()))
+            }
+
+        full_properties = self.properties(default_state)
+        full_properties.update({key: str(value).lower() if type(value) is bool else str(value)
+                                for key, value in properties.items()})
+
+        key = (self._block_index(name), _properties_string(full_properties))
+        if key not in self._states_by_properties:
+            raise KeyError(f"{name!r} has no state with {properties}")
+
+        return self._states_by_properties[key]
+
+    def states_where(self, names=None, **properties):
+        """
+        :return: array of the block state ids of the given blocks (all by default) with the given property values
+        """
+        mask = np.ones(len(self), dtype='bool')
+        if names is not None:
+            names = [names] if type(names) is str else names
+            mask &= np.isin(self.state_block, [self._block_index(name) for name in names])
+
+        for key, value in properties.items():
+            value = str(value).lower() if type(value) is bool else str(value)
+            mask &= np.char.find(np.char.add(',', np.char.add(self.state_properties, ',')), f',{key}={value},') >= 0
+
+        return np.flatnonzero(mask)
+
+    @classmethod
+    def from_data_generator(cls, blocks, protocol_version, minecraft_data=None):
+        """
+        :param blocks: parsed reports/blocks.json of the data generator
+        :param minecraft_data: parsed minecraft-data blocks.json to take the hardness and collision from
+        """
+        blocks = sorted(blocks.items(), key=lambda item: min(state['id'] for state in item[1]['states']))
+        state_count = max(max(state['id'] for state in block['states']) for _, block in blocks) + 1
+
+        block_names, block_first_state, block_default_state = [], [], []
+        state_block = np.zeros(state_count, dtype='int32')
+        state_properties = [''] * state_count
+
+        for index, (name, block) in enumerate(blocks):
+            block_names.append(_block_name(name))
+            block_first_state.append(min(state['id'] for state in block['states']))
+            block_default_state.append(next((state['id'] for state in block['states'] if state.get('default')),
+                                            block_first_state[-1]))
+
+            for state in block['states']:
+                state_block[state['id']] = index
+                state_properties[state['id']] = _properties_string(state.get('properties', {}))
+
+        hardness = np.full(len(block_names), np.nan, dtype='float32')
+        solid = None
+        if minecraft_data is not None:
+            extra = {block['name']: block for block in minecraft_data}
+            hardness = np.array([np.nan if extra.get(name, {}).get('hardness') is None else extra[name]['hardness']
+                                 for name in block_names], dtype='float32')
+            solid = np.array([extra.get(name, {}).get('boundingBox') == 'block' for name in block_names])[state_block]
+
+        if solid is None:
+            # Without collision data every block but air and liquids is taken as solid
+            names = np.asarray(block_names)
+            solid = ~np.isin(names, list(AIR_BLOCKS | LIQUID_BLOCKS))[state_block]
+
+        return cls(protocol_version, block_names, block_first_state, block_default_state, state_block,
+                   state_properties, hardness, solid)
+
+    @classmethod
+    def from_minecraft_data(cls, blocks, protocol_version):
+        """
+        :param blocks: parsed minecraft-data blocks.json, the properties of each state are
+        enumerated with the last property changing the fastest
+        """
+        blocks = sorted(blocks, key=lambda block: block['minStateId'])
+        state_count = max(block['maxStateId'] for block in blocks) + 1
+
+        block_names, block_first_state, block_default_state, hardness = [], [], [], []
+        state_block = np.zeros(state_count, dtype='int32')
+        state_properties = [''] * state_count
+        solid = np.zeros(state_count, dtype='bool')
+
+        for index, block in enumerate(blocks):
+            block_names.append(_block_name(block['name']))
+            block_first_state.append(block['minStateId'])
+            block_default_state.append(block.get('defaultState', block['minStateId']))
+            hardness.append(np.nan if block.get('hardness') is None else block['hardness'])
+
+            first_state, last_state = block['minStateId'], block['maxStateId']
+            state_block[first_state:last_state + 1] = index
+            solid[first_state:last_state + 1] = block.get('boundingBox') == 'block'
+
+            definitions = block.get('states', [])
+            values = [definition.get('values') or (['true', 'false'] if definition['type'] == 'bool' else
+                                                    [str(value) for value in range(definition['num_values'])])
+                      for definition in definitions]
+
+            for state in range(first_state, last_state + 1):
+                offset, properties = state - first_state, {}
+                for definition, property_values in zip(reversed(definitions), reversed(values)):
+                    offset, value_index = divmod(offset, len(property_values))
+                    properties[definition['name']] = str(property_values[value_index])
+                state_properties[state] = _properties_string(properties)
+
+        return cls(protocol_version, block_names, block_first_state, block_default_state, state_block,
+                   state_properties, hardness, solid)
+
+    def save(self, path):
+        """
+        Writes the tables to a temporary file moved over path once complete, so processes
+        loading the cache at the same time never read a partly written one
+        """
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)), suffix='.npz.tmp',
+                                         delete=False) as file:
+            try:
+                np.savez(file,
+                         cache_format=self.CACHE_FORMAT,
+                         protocol_version=self.protocol_version,
+                         block_names=self.block_names,
+                         block_first_state=self.block_first_state,
+                         block_default_state=self.block_default_state,
+                         state_block=self.state_block,
+                         state_properties=self.state_properties,
+                         hardness=self.block_hardness,
+                         solid=self.solid)
+            except BaseException:
+                file.close()
+                os.remove(file.name)
+                raise
+
+        try:
+            os.replace(file.name, path)
+        except OSError:
+            os.remove(file.name)
+            raise
+
+    @classmethod
+    def from_cache(cls, path):
+        with np.load(path) as cache:
+            if int(cache['cache_format']) != cls.CACHE_FORMAT:
+                raise ValueError(f"Block registry cache {path} has an old format")
+
+            return cls(int(cache['protocol_version']),
+                       cache['block_names'],
+                       cache['block_first_state'],
+                       cache['block_default_state'],
+                       cache['state_block'],
+                       cache['state_properties'],
+                       cache['hardness'],
+                       cache['solid'])
+
+    @classmethod
+    def load(cls, path, protocol_version, minecraft_data_path=None, cache_dir=os.path.join('~', '.cache', 'pyMClient')):
+        """
+        Loads a blocks.json of either format, the compiled tables are cached so the
+        JSON is only parsed again when the file or the protocol version change
+        :param path: data generator or minecraft-data blocks.json
+        :param protocol_version: protocol the block state ids belong to
+        :param minecraft_data_path: minecraft-data blocks.json to complete a data generator report with
+        :param cache_dir: directory of the cached tables, None to disable the cache
+        """
+        sources = [path] + ([minecraft_data_path] if minecraft_data_path else [])
+
+        cache_path = None
+        if cache_dir is not None:
+            digest = hashlib.sha1(repr([(os.path.abspath(source), os.path.getsize(source), os.path.getmtime(source))
+                                        for source in sources]).encode()).hexdigest()[:16]
+            cache_path = os.path.join(os.path.expanduser(cache_dir), f'blocks-{protocol_version}-{digest}.npz')
+
+            if os.path.exists(cache_path):
+                try:
+                    return cls.from_cache(cache_path)
+                except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+                    # Rebuilt from the JSON and saved again below
+                    pass
+
+        with open(path) as file:
+            blocks = json.load(file)
+
+        if type(blocks) is list:
+            registry = cls.from_minecraft_data(blocks, protocol_version)
+        else:
+            minecraft_data = None
+            if minecraft_data_path:
+                with open(minecraft_data_path) as file:
+                    minecraft_data = json.load(file)
+
+            registry = cls.from_data_generator(blocks, protocol_version, minecraft_data)
+
+        if cache_path is not None:
+            try:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                registry.save(cache_path)
+            except OSError:
+                # The cache only saves time, the registry works without it
+                pass
+
+        return registry
@@ -0,0 +1,120 @@
+from twisted.internet import reactor
+from MinecraftQuarryClient import MinecraftQuarryClient, start_reactor
+from typing import Dict
+import time
+
+
+class BotPool:
+    """
+    Many clients in one process, all of them on the single reactor thread. Logins are staggered
+    so the server doesn't get every handshake in the same tick
+    """
+
+    def __init__(self,
+                 client_class=MinecraftQuarryClient,
+                 login_interval: float = 0.05,
+                 protocol_version: int = None):
+        """
+        :param client_class: MinecraftQuarryClient or a subclass with the bots' behaviour
+        :param login_interval: seconds between two bots connecting
+        :param protocol_version: forced on the bots, the server's version is used by default
+        """
+        self.client_class = client_class
+        self.login_interval = login_interval
+        self.protocol_version = protocol_version
+
+        self.bots: Dict[str, MinecraftQuarryClient] = {}
+        # Username -> last PacketCounters.sample() taken by stats
+        self._samples = {}
+
+    def __len__(self):
+        return len(self.bots)
+
+    def __iter__(self):
+        return iter(self.bots.values())
+
+    def __getitem__(self, username):
+        return self.bots[username]
+
+    def add(self, username, **kwargs):
+        """
+        Creates a bot, kwargs are passed to client_class
+        """
+        if username in self.bots:
+            raise ValueError(f"There is already a bot named {username!r}")
+
+        bot = self.client_class(username, **kwargs)
+        if self.protocol_version is not None:
+            bot.factory.force_protocol_version = self.protocol_version
+
+        self.bots[username] = bot
+        return bot
+
+    def remove(self, username):
+        bot = self.bots.pop(username)
+        self._samples.pop(username, None)
+        bot.disconnect()
+        return bot
+
+    def _connect(self, bot: MinecraftQuarryClient, address, port):
+        if bot._login_error is not None:
+            return
+
+        if not bot._profile_loaded.is_set():
+            # Online accounts connect once their profile is loaded
+            bot._profile_request.addBoth(lambda _: self._connect(bot, address, port))
+            return
+
+        bot.factory.connect(address, port)
+
+    def join(self, address: str, port: int = 25565, timeout: float = 30, bots=None):
+        """
+        Joins the server with every bot, waiting until all have a position or failed
+        :param timeout: seconds the login of each bot may take, counted from its turn to connect
+        :param bots: usernames of the bots to join, all by default
+        :return: dict of username -> exception of the bots that couldn't join
+        """
+        bots = [self.bots[username] for username in (self.bots if bots is None else bots)]
+        start_reactor()
+
+        started = time.monotonic()
+        for index, bot in enumerate(bots):
+            bot._reset_login()
+            reactor.callFromThread(reactor.callLater, index * self.login_interval, self._connect, bot, address, port)
+
+        failures = {}
+        for index, bot in enumerate(bots):
+            try:
+                bot._wait_login_step(bot._profile_loaded, started + index * self.login_interval + timeout,
+                                     "the account profile")
+                bot._wait_login(started + index * self.login_interval + timeout)
+            except (TimeoutError, ConnectionError) as error:
+                failures[bot.player.username] = error
+
+        return failures
+
+    def disconnect(self):
+        for bot in self.bots.values():
+            bot.disconnect()
+
+    def stats(self):
+        """
+        Packet rates since the previous call, or since the bots were created
+        :return: dict with the rates of each bot under 'bots' and their sums under 'total'
+        """
+        keys = ('packets_received', 'bytes_received', 'packets_sent', 'bytes_sent')
+        total = dict.fromkeys(keys, 0.0)
+        bots = {}
+
+        for username, bot in self.bots.items():
+            counters = bot.packet_counters
+            sample = counters.sample()
+            previous = self._samples.get(username, None) or dict(dict.fromkeys(keys, 0), time=counters.started)
+            self._samples[username] = sample
+
+            seconds = max(sample['time'] - previous['time'], 1e-9)
+            rates = bots[username] = {f'{key}_per_second': (sample[key] - previous[key]) / seconds for key in keys}
+            for key in keys:
+                total[key] += rates[f'{key}_per_second']
+
+        return dict(bots=bots, total={f'{key}_per_second': value for key, value in total.items()})
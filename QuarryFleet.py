@@ -0,0 +1,216 @@
+from multiprocessing.connection import Connection
+from MinecraftQuarryClient import MinecraftQuarryClient, start_reactor
+import multiprocessing
+import traceback
+import os
+
+
+def _bot_status(bot: MinecraftQuarryClient):
+    return dict(joined=bot._position_loaded.is_set() and bot._login_error is None,
+                error=bot._login_error,
+                x=bot.player.x,
+                y=bot.player.y,
+                z=bot.player.z,
+                health=getattr(bot.player, 'health', None))
+
+
+def _worker(connection: Connection, client_class, protocol_version, login_interval):
+    """
+    Main loop of a worker process, answers the commands of the Fleet with ('ok', result) or ('error', message)
+    """
+    # Imported here so the reactor is only created in the worker
+    from twisted.internet import reactor
+    from twisted.internet.threads import blockingCallFromThread
+    from QuarryBotPool import BotPool
+
+    pool = BotPool(client_class, login_interval, protocol_version)
+    # Calls are run by the reactor, which has to run before any bot joined
+    start_reactor()
+
+    def call(usernames, method, args, kwargs):
+        results = {}
+        for username in usernames or list(pool.bots):
+            results[username] = getattr(pool[username], method)(*args, **kwargs)
+        return results
+
+    while True:
+        command, args = connection.recv()
+        try:
+            if command == 'add':
+                usernames, kwargs = args
+                for username in usernames:
+                    pool.add(username, **kwargs)
+                result = None
+            elif command == 'join':
+                result = {username: str(error) for username, error in pool.join(*args).items()}
+            elif command == 'call':
+                usernames, method, call_args, kwargs, in_reactor = args
+                if in_reactor:
+                    # Bot methods send packets, which should happen on the reactor thread
+                    result = blockingCallFromThread(reactor, call, usernames, method, call_args, kwargs)
+                else:
+                    result = call(usernames, method, call_args, kwargs)
+            elif command == 'status':
+                stats = pool.stats()
+                result = {username: dict(_bot_status(bot), **stats['bots'][username])
+                          for username, bot in pool.bots.items()}
+            elif command == 'stop':
+                pool.disconnect()
+                connection.send(('ok', None))
+                break
+            else:
+                raise ValueError(f"Unknown command {command!r}")
+        except Exception:
+            connection.send(('error', traceback.format_exc()))
+        else:
+            connection.send(('ok', result))
+
+    if reactor.running:
+        reactor.callFromThread(reactor.stop)
+
+
+class Fleet:
+    """
+    Bots spread over worker processes, each one running a BotPool on its own reactor, so packet
+    parsing and chunk decoding use every core. The bots are driven from this process by commands
+    sent to all the workers at once
+    """
+
+    def __init__(self,
+                 workers: int = None,
+                 client_class=MinecraftQuarryClient,
+                 protocol_version: int = None,
+                 login_interval: float = 0.05):
+        """
+        :param workers: worker processes, one per core by default
+        :param client_class: MinecraftQuarryClient or a subclass, it must be importable by the workers
+        """
+        self.workers = workers or os.cpu_count()
+        self.client_class = client_class
+        self.protocol_version = protocol_version
+        self.login_interval = login_interval
+
+        self._processes = []
+        self._connections = []
+        # Username -> worker index
+        self.bots = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        # Spawned instead of forked, a fork would copy the threads and the reactor of this process
+        context = multiprocessing.get_context('spawn')
+        for _ in range(self.workers):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=_worker,
+                                      args=(worker_connection, self.client_class, self.protocol_version,
+                                            self.login_interval),
+                                      daemon=True)
+            process.start()
+            self._processes.append(process)
+            self._connections.append(connection)
+
+    def stop(self):
+        if self._processes:
+            self._command(range(self.workers), 'stop')
+            for process in self._processes:
+                process.join()
+            self._processes, self._connections = [], []
+
+    def _command(self, workers, command, *args, per_worker=None):
+        """
+        Sends a command to some workers, then waits for all their answers
+        :param per_worker: function of the worker index returning its args, instead of the same args for all
+        :return: list of the results of each worker
+        """
+        workers = list(workers)
+        for worker in workers:
+            self._connections[worker].send((command, per_worker(worker) if per_worker else args))
+
+        results, errors = [], []
+        for worker in workers:
+            status, result = self._connections[worker].recv()
+            if status == 'error':
+                errors.append(f"Worker {worker}: {result}")
+            results.append(result)
+
+        if errors:
+            raise RuntimeError('\n'.join(errors))
+
+        return results
+
+    def _shards(self, usernames=None):
+        """
+        :return: dict of worker index -> usernames of the bots (all by default) it runs
+        """
+        shards = {}
+        for username in self.bots if usernames is None else usernames:
+            shards.setdefault(self.bots[username], []).append(username)
+        return shards
+
+    def add(self, usernames, **kwargs):
+        """
+        Creates bots, spread round robin over the workers, kwargs are passed to client_class
+        """
+        shards = {}
+        for username in usernames:
+            if username in self.bots:
+                raise ValueError(f"There is already a bot named {username!r}")
+            worker = len(self.bots) % self.workers
+            self.bots[username] = worker
+            shards.setdefault(worker, []).append(username)
+
+        self._command(shards, 'add', per_worker=lambda worker: (shards[worker], kwargs))
+
+    def join(self, address: str, port: int = 25565, timeout: float = 30):
+        """
+        Joins the server with every bot, the workers log in their bots at the same time
+        :return: dict of username -> error message of the bots that couldn't join
+        """
+        failures = {}
+        for result in self._command(range(self.workers), 'join', address, port, timeout):
+            failures.update(result)
+        return failures
+
+    def call(self, method: str, *args, usernames=None, in_reactor=True, **kwargs):
+        """
+        Calls a method of the bots (all by default) in their workers, e.g. call('send_chat_message', 'hi').
+        Arguments and results are pickled
+        :param in_reactor: run the method on the worker's reactor thread. Methods that wait for the
+        server (join_server, break_block, click_window...) never return there, as the reactor can't
+        receive what they wait for while it runs them: call them with in_reactor=False
+        :return: dict of username -> result
+        """
+        shards = self._shards(usernames)
+        results = {}
+        for result in self._command(shards, 'call',
+                                    per_worker=lambda worker: (shards[worker], method, args, kwargs, in_reactor)):
+            results.update(result)
+        return results
+
+    def status(self):
+        """
+        :return: dict of username -> dict of its state and packet rates since the previous call
+        """
+        statuses = {}
+        for worker, result in enumerate(self._command(range(self.workers), 'status')):
+            for status in result.values():
+                status['worker'] = worker
+            statuses.update(result)
+        return statuses
+
+    def stats(self):
+        """
+        :return: packet rates since the previous status call summed over the fleet
+        """
+        total = {}
+        for status in self.status().values():
+            for key, value in status.items():
+                if key.endswith('_per_second'):
+                    total[key] = total.get(key, 0) + value
+        return total
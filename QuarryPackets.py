@@ -0,0 +1,249 @@
+from quarry.types.buffer import Buffer1_14
+from quarry.types.chunk import PackedArray
+from quarry.net.protocol import ProtocolError
+from quarry.types import nbt
+from quarry.data import packets
+from typing import Dict
+import numpy as np
+import struct
+import zlib
+
+
+# Varints of 0-127 are a single byte, which covers most of the ids, statuses and hands sent
+_SMALL_VARINTS = [bytes((value,)) for value in range(128)]
+
+
+def pack_varint(value):
+    """
+    Same bytes as Buffer1_14.pack_varint
+    """
+    if 0 <= value < 128:
+        return _SMALL_VARINTS[value]
+
+    if value < 0:
+        value += 1 << 32
+
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+    return bytes(out)
+
+
+def pack_string(text):
+    text = text.encode('utf-8')
+    return pack_varint(len(text)) + text
+
+
+def position_value(x, y, z):
+    """
+    Block position packed in a long as in Buffer1_14.pack_position
+    """
+    return ((x & 0x3FFFFFF) << 38) | ((z & 0x3FFFFFF) << 12) | (y & 0xFFF)
+
+
+class PacketEncoder:
+    """
+    Payloads of the packets the client sends, with precompiled structs instead of a Buffer1_14 per
+    packet. There is one encoder per protocol version, created once with PacketEncoder.get. Structs
+    write straight into the bytes they return, so no scratch buffer is shared between the threads
+    that send packets
+    """
+
+    _encoders: Dict[int, 'PacketEncoder'] = {}
+
+    _POSITION = struct.Struct('>ddd?')
+    _POSITION_AND_LOOK = struct.Struct('>dddff?')
+    _LOOK = struct.Struct('>ff?')
+    _SHORT = struct.Struct('>h')
+    _UNSIGNED_BYTE = struct.Struct('>B')
+    _LONG = struct.Struct('>Q')
+    # Position and face byte of player_digging, after the status varint
+    _DIGGING = struct.Struct('>QB')
+    # Cursor and inside block of player_block_placement, after the hand varint, position and face varint
+    _BLOCK_PLACEMENT = struct.Struct('>fff?')
+    _CONFIRM_TRANSACTION = struct.Struct('>bh?')
+    _TARGET = struct.Struct('>fff')
+    _BOOL = struct.Struct('>?')
+    _CLICK_HEADER = struct.Struct('>hb')
+
+    def __init__(self, protocol_version):
+        self.protocol_version = protocol_version
+
+        # Packet name -> varint of its id, play mode packets sent by the client
+        self.packet_ids: Dict[str, bytes] = {
+            name: pack_varint(ident) for (version, mode, direction, name), ident in packets.packet_idents.items()
+            if version == protocol_version and mode == 'play' and direction == 'upstream'
+        }
+
+    @classmethod
+    def get(cls, protocol_version):
+        encoder = cls._encoders.get(protocol_version, None)
+        if encoder is None:
+            encoder = cls._encoders[protocol_version] = cls(protocol_version)
+        return encoder
+
+    def frame(self, name, payload, compression_threshold=-1):
+        """
+        Same bytes as Buffer1_14.pack_packet of the id and payload of a play packet
+        """
+        try:
+            data = self.packet_ids[name] + payload
+        except KeyError:
+            raise ProtocolError(f"No ID known for packet: {(self.protocol_version, 'play', 'upstream', name)}") from None
+
+        if compression_threshold >= 0:
+            if len(data) >= compression_threshold:
+                data = pack_varint(len(data)) + zlib.compress(data)
+            else:
+                data = b'\x00' + data
+
+        return pack_varint(len(data)) + data
+
+    def player_position(self, x, y, z, on_ground=True):
+        return self._POSITION.pack(x, y, z, on_ground)
+
+    def player_position_and_look(self, x, y, z, yaw, pitch, on_ground=True):
+        return self._POSITION_AND_LOOK.pack(x, y, z, yaw, pitch, on_ground)
+
+    def player_look(self, yaw, pitch, on_ground=True):
+        return self._LOOK.pack(yaw, pitch, on_ground)
+
+    def player_digging(self, status, x=0, y=0, z=0, face=0):
+        return pack_varint(status) + self._DIGGING.pack(position_value(x, y, z), face)
+
+    def player_block_placement(self, hand, x, y, z, face, cursor_x, cursor_y, cursor_z, inside_block=False):
+        return (pack_varint(hand) + self._LONG.pack(position_value(x, y, z)) + pack_varint(face) +
+                self._BLOCK_PLACEMENT.pack(cursor_x, cursor_y, cursor_z, inside_block))
+
+    def held_item_change(self, slot):
+        return self._SHORT.pack(slot)
+
+    def close_window(self, window_id):
+        return self._UNSIGNED_BYTE.pack(window_id)
+
+    def confirm_transaction(self, window_id, action_number, accepted):
+        return self._CONFIRM_TRANSACTION.pack(window_id, action_number, accepted)
+
+    def click_window(self, window_id, slot_number, button, mode, state_id, action_id, slot_data,
+                     new_slot_data_array=()):
+        """
+        :param state_id: used from 1.17
+        :param action_id: used before 1.17
+        :param new_slot_data_array: (slot, slot data) of the changed slots, from 1.17
+        """
+        if self.protocol_version >= 755:  # 1.17
+            return b''.join((
+                self._UNSIGNED_BYTE.pack(window_id),
+                pack_varint(state_id),
+                self._CLICK_HEADER.pack(slot_number, button),
+                pack_varint(mode),
+                pack_varint(len(new_slot_data_array)),
+                *(self._SHORT.pack(slot) + Buffer1_14.pack_slot(**data) for slot, data in new_slot_data_array),
+                Buffer1_14.pack_slot(**slot_data)
+            ))
+
+        return b''.join((
+            self._UNSIGNED_BYTE.pack(window_id),
+            self._CLICK_HEADER.pack(slot_number, button),
+            self._SHORT.pack(action_id),
+            pack_varint(mode),
+            Buffer1_14.pack_slot(**slot_data)
+        ))
+
+    def use_entity(self, entity_id, action_type, target_x=None, target_y=None, target_z=None, hand=0,
+                   sneaking=False):
+        """
+        :param action_type: 0 interact, 1 attack, 2 interact at the target
+        """
+        target = b''
+        if action_type == 2:
+            target = self._TARGET.pack(target_x, target_y, target_z) + pack_varint(hand)
+
+        return pack_varint(entity_id) + pack_varint(action_type) + target + self._BOOL.pack(sneaking)
+
+    @staticmethod
+    def varints(*values):
+        """
+        Payload of the packets made only of varints: teleport_confirm, use_item, client_status, entity_action...
+        """
+        return b''.join(map(pack_varint, values))
+
+    @staticmethod
+    def varint_and_string(value, text):
+        return pack_varint(value) + pack_string(text)
+
+    @staticmethod
+    def string(text):
+        return pack_string(text)
+
+    def varint_and_position(self, value, x, y, z):
+        return pack_varint(value) + self._LONG.pack(position_value(x, y, z))
+
+
+# Packets sent by servers, built for the test server and the benchmarks
+def pack_longs(bits_per_value, values):
+    """
+    Packs values the way chunk sections and heightmaps are sent since 1.16,
+    (64 // bits_per_value) values per long starting from the least significant bit
+    :return: big-endian bytes of the longs
+    """
+    per_long = 64 // bits_per_value
+    values = np.asarray(values, dtype='uint64')
+    values = np.concatenate([values, np.zeros(-len(values) % per_long, dtype='uint64')]).reshape((-1, per_long))
+    shifts = np.arange(per_long, dtype='uint64') * np.uint64(bits_per_value)
+
+    return np.bitwise_or.reduce(values << shifts, axis=1).astype('>u8').tobytes()
+
+
+def chunk_packet(chunk_x, chunk_z, sections, heights=None):
+    """
+    Builds a chunk_data packet body in the 1.17 (protocol 755) layout read by Chunks.unpack_chunk_data:
+    no full chunk bool and the section mask sent as a varint length plus longs
+    :param sections: list of (bits_per_block, palette, indices), None for an empty section
+    :param heights: 256 MOTION_BLOCKING values ordered as [z][x]
+    """
+    pack, pack_varint = Buffer1_14.pack, Buffer1_14.pack_varint
+
+    bit_mask = 0
+    sections_data = b''
+    for index, section in enumerate(sections):
+        if section is None:
+            continue
+
+        bit_mask |= 1 << index
+        bits_per_block, palette, indices = section
+        data_array = pack_longs(bits_per_block, indices)
+
+        sections_data += pack('hB', 4096, bits_per_block)
+        if bits_per_block <= 8:
+            sections_data += pack_varint(len(palette)) + b''.join(pack_varint(value) for value in palette)
+        sections_data += pack_varint(len(data_array) // 8) + data_array
+
+    height_map = pack_longs(9, np.zeros(256) if heights is None else np.asarray(heights).ravel())
+    height_maps = nbt.TagRoot({'': nbt.TagCompound({
+        'MOTION_BLOCKING': nbt.TagLongArray(PackedArray.from_bytes(height_map, len(height_map) // 8, 64, 64))
+    })})
+
+    return (pack('ii', chunk_x, chunk_z) +
+            pack_varint(1) + pack('q', bit_mask) +
+            Buffer1_14.pack_nbt(height_maps) +
+            pack_varint(1024) + pack_varint(1) * 1024 +
+            pack_varint(len(sections_data)) + sections_data +
+            pack_varint(0))
+
+
+def multi_block_change_packet(chunk_x, chunk_y, chunk_z, blocks):
+    """
+    Builds a multi_block_change packet body (1.16.2+ format)
+    :param blocks: (N, 4) block state id, x, y, z in the section
+    """
+    position = ((chunk_x & 0x3FFFFF) << 42) | ((chunk_z & 0x3FFFFF) << 20) | (chunk_y & 0xFFFFF)
+    if position >= 1 << 63:
+        position -= 1 << 64
+
+    return (Buffer1_14.pack('q?', position, False) + Buffer1_14.pack_varint(len(blocks)) +
+            b''.join(Buffer1_14.pack_varint(int(block_state_id) << 12 | int(x) << 8 | int(z) << 4 | int(y), max_bits=64)
+                     for block_state_id, x, y, z in blocks))
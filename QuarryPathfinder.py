@@ -0,0 +1,247 @@
+from heapq import heappush, heappop
+from functools import lru_cache
+from math import sqrt
+import numpy as np
+import weakref
+import time
+
+
+@lru_cache(maxsize=16)
+def _block_state_tables(passable_block_state_ids: frozenset, avoided_block_state_ids: frozenset):
+    """
+    (passable, walkable) tables indexed by block state id, read only and shared by all the bots of a
+    process. Only the most recently used sets of block states are kept
+    """
+    passable = np.zeros(1 << 16, dtype='bool')
+    passable[list(passable_block_state_ids)] = True
+
+    walkable = ~passable
+    walkable[list(avoided_block_state_ids)] = False
+    passable[list(avoided_block_state_ids)] = False
+
+    passable.flags.writeable = walkable.flags.writeable = False
+    return passable, walkable
+
+
+class Pathfinder:
+    """
+    A* search over the standing positions of the loaded chunks. A position (x, y, z) can be
+    stood on when the block under it is walkable and the two blocks of the player's body are passable
+    """
+
+    # (dx, dz, cost) of the horizontal moves, diagonals last
+    _MOVES = ((1, 0, 1.0), (-1, 0, 1.0), (0, 1, 1.0), (0, -1, 1.0),
+              (1, 1, sqrt(2)), (1, -1, sqrt(2)), (-1, 1, sqrt(2)), (-1, -1, sqrt(2)))
+
+    def __init__(self,
+                 world,
+                 passable_block_state_ids=None,
+                 avoided_block_state_ids=(),
+                 max_nodes: int = 20000,
+                 timeout: float = 0.5,
+                 max_drop: int = 3,
+                 jump_cost: float = 0.5,
+                 diagonals: bool = True):
+        """
+        :param passable_block_state_ids: block states the player can walk through, air states of the world by default
+        :param avoided_block_state_ids: block states that can't be walked through nor stood on (lava, fire...)
+        :param max_nodes: positions expanded before a search gives up
+        :param timeout: seconds before a search gives up
+        :param max_drop: blocks the player may fall in a single move
+        """
+        self.world = world
+
+        self.max_nodes = max_nodes
+        self.timeout = timeout
+        self.max_drop = max_drop
+        self.jump_cost = jump_cost
+        self.diagonals = diagonals
+
+        self.passable: np.ndarray = None
+        self.walkable: np.ndarray = None
+        # (chunk_x, chunk_z) -> (weak reference to the chunk, {section_index: (standable, passable)}), grids are
+        # bytes indexed as [y][z][x]. A column goes away with its chunk, so evicted chunks are not kept alive here
+        self._grids = {}
+        self.set_block_states(passable_block_state_ids, avoided_block_state_ids)
+
+    def set_block_states(self, passable_block_state_ids=None, avoided_block_state_ids=()):
+        """
+        Sets the lookup tables of every block state, dropping all the cached grids
+        """
+        if passable_block_state_ids is None:
+            passable_block_state_ids = self.world.chunks.air_block_state_ids
+
+        self.passable, self.walkable = _block_state_tables(frozenset(passable_block_state_ids),
+                                                           frozenset(avoided_block_state_ids))
+        self._grids.clear()
+
+    def invalidate_block(self, x, y, z):
+        """
+        Drops the grids depending on a block, called on block changes
+        """
+        column = self._grids.get((x >> 4, z >> 4), None)
+        if column is not None:
+            # The standing grid of a section also reads the blocks right under and above it
+            for section_index in range((y - 1) >> 4, ((y + 1) >> 4) + 1):
+                column[1].pop(section_index, None)
+
+    def invalidate_section(self, chunk_x, section_index, chunk_z):
+        column = self._grids.get((chunk_x, chunk_z), None)
+        if column is not None:
+            for index in (section_index - 1, section_index, section_index + 1):
+                column[1].pop(index, None)
+
+    def forget_chunk(self, chunk_x, chunk_z):
+        self._grids.pop((chunk_x, chunk_z), None)
+
+    def clear(self):
+        self._grids.clear()
+
+    def _chunk_collected(self, key, ref):
+        column = self._grids.get(key, None)
+        if column is not None and column[0] is ref:
+            self._grids.pop(key, None)
+
+    def _section_grids(self, chunk_x, section_index, chunk_z):
+        """
+        :return: (standable, passable) bytes of a section, None if its chunk is not loaded
+        """
+        with self.world.chunks.lock.reading():
+            chunk = self.world.chunks[chunk_x, chunk_z]
+            if chunk is None or not 0 <= section_index < chunk.height >> 4:
+                return None
+
+            column = self._grids.get((chunk_x, chunk_z), None)
+            if column is None or column[0]() is not chunk:
+                # The chunk was sent again since the grids were computed
+                column = self._grids[(chunk_x, chunk_z)] = (
+                    weakref.ref(chunk, lambda ref, key=(chunk_x, chunk_z): self._chunk_collected(key, ref)), {})
+
+            grids = column[1].get(section_index, None)
+            if grids is not None:
+                return grids
+
+            # The layer under the section and the two over it are needed, air outside the world
+            region = chunk.get_region(0, section_index * 16 - 1, 0, 15, section_index * 16 + 17, 15, fill=0)
+
+        passable, walkable = self.passable[region], self.walkable[region]
+        grids = column[1][section_index] = (
+            (walkable[0:16] & passable[1:17] & passable[2:18]).tobytes(),
+            passable[1:17].tobytes()
+        )
+
+        return grids
+
+    def find_path(self, start, goal, max_nodes=None, timeout=None, partial=False):
+        """
+        :param start: (x, y, z) block position of the player's feet
+        :param goal: (x, y, z) block position to reach
+        :param max_nodes: overrides Pathfinder.max_nodes
+        :param timeout: overrides Pathfinder.timeout
+        :param partial: when the goal can't be reached, return the path to the closest position found instead of None
+        :return: list of (x, y, z) waypoints from start to goal, both included, or None
+        """
+        start, goal = tuple(int(value) for value in start), tuple(int(value) for value in goal)
+        max_nodes = self.max_nodes if max_nodes is None else max_nodes
+        timeout = self.timeout if timeout is None else timeout
+
+        # Grids fetched during this search, looked up once per section
+        section_grids = {}
+
+        def grids(x, y, z):
+            key = (x >> 4, y >> 4, z >> 4)
+            _grids = section_grids.get(key, False)
+            if _grids is False:
+                _grids = section_grids[key] = self._section_grids(*key)
+            return _grids
+
+        def standable(x, y, z):
+            _grids = grids(x, y, z)
+            return _grids is not None and _grids[0][((y & 15) << 8) | ((z & 15) << 4) | (x & 15)]
+
+        def passable(x, y, z):
+            _grids = grids(x, y, z)
+            return _grids is not None and _grids[1][((y & 15) << 8) | ((z & 15) << 4) | (x & 15)]
+
+        goal_x, goal_y, goal_z = goal
+
+        def heuristic(x, y, z):
+            # Falling is the cheapest vertical move, so the estimate never exceeds the real cost
+            return sqrt((x - goal_x) ** 2 + (z - goal_z) ** 2) + abs(y - goal_y) * 0.1
+
+        moves = self._MOVES if self.diagonals else self._MOVES[:4]
+        max_drop, jump_cost = self.max_drop, self.jump_cost
+
+        came_from = {start: None}
+        costs = {start: 0.0}
+        open_set = [(heuristic(*start), 0.0, start)]
+        closest, closest_distance = start, heuristic(*start)
+
+        started = time.perf_counter()
+        expanded = 0
+
+        while open_set:
+            _, cost, node = heappop(open_set)
+            if node == goal:
+                return self._rebuild_path(came_from, node)
+
+            if cost > costs[node]:
+                # Stale entry, a cheaper way to this node was pushed later
+                continue
+
+            expanded += 1
+            if expanded > max_nodes or (not expanded & 255 and time.perf_counter() - started > timeout):
+                break
+
+            x, y, z = node
+            head_clear = passable(x, y + 2, z)
+
+            for dx, dz, move_cost in moves:
+                nx, nz = x + dx, z + dz
+
+                if dx and dz and not (passable(x + dx, y, z) and passable(x + dx, y + 1, z) and
+                                      passable(x, y, z + dz) and passable(x, y + 1, z + dz)):
+                    # Diagonals can't cut corners
+                    continue
+
+                if standable(nx, y, nz):
+                    neighbours = (((nx, y, nz), move_cost),)
+                elif not (passable(nx, y, nz) and passable(nx, y + 1, nz)):
+                    # Blocked at the feet or the head, maybe it can be jumped on
+                    if dx and dz or not head_clear or not standable(nx, y + 1, nz):
+                        continue
+                    neighbours = (((nx, y + 1, nz), move_cost + jump_cost),)
+                else:
+                    neighbours = ()
+                    for drop in range(1, max_drop + 1):
+                        if standable(nx, y - drop, nz):
+                            neighbours = (((nx, y - drop, nz), move_cost + drop * 0.1),)
+                            break
+                        if not passable(nx, y - drop, nz):
+                            break
+
+                for neighbour, step_cost in neighbours:
+                    new_cost = cost + step_cost
+                    if new_cost < costs.get(neighbour, float('inf')):
+                        costs[neighbour] = new_cost
+                        came_from[neighbour] = node
+
+                        distance = heuristic(*neighbour)
+                        if distance < closest_distance:
+                            closest, closest_distance = neighbour, distance
+
+                        heappush(open_set, (new_cost + distance, new_cost, neighbour))
+
+        if partial:
+            return self._rebuild_path(came_from, closest)
+
+        return None
+
+    @staticmethod
+    def _rebuild_path(came_from, node):
+        path = []
+        while node is not None:
+            path.append(node)
+            node = came_from[node]
+
+        return path[::-1]
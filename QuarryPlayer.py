@@ -1,10 +1,16 @@
 from quarry.types.buffer import Buffer1_14
 from quarry.types.chat import Message
-from threading import Thread
+from threading import Thread, Lock, RLock, Condition, get_ident
+from contextlib import contextmanager
+from functools import wraps
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, CancelledError, wait
 from enum import Enum
 from typing import Dict
+from collections import OrderedDict
 from bitstring import BitStream
 import numpy as np
+import struct
+import copy
 import time
 
 _MinecraftQuarryClient = object
@@ -22,6 +28,81 @@ def thread(func):
     return wrapper
 
 
+class RWLock:
+    """
+    Readers-writer lock, any number of threads can read at once while writing is exclusive.
+    Waiting writers hold back new readers so a steady stream of reads can't starve them.
+    Both sides are reentrant and the writing thread may also read, but a reader can't start writing
+    """
+
+    def __init__(self):
+        self._condition = Condition(Lock())
+        self._readers: Dict[int, int] = {}
+        self._writer = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        ident = get_ident()
+        with self._condition:
+            if ident not in self._readers and self._writer != ident:
+                while self._writer is not None or self._writers_waiting:
+                    self._condition.wait()
+
+            self._readers[ident] = self._readers.get(ident, 0) + 1
+
+    def release_read(self):
+        ident = get_ident()
+        with self._condition:
+            self._readers[ident] -= 1
+            if not self._readers[ident]:
+                del self._readers[ident]
+                if not self._readers:
+                    self._condition.notify_all()
+
+    def acquire_write(self):
+        ident = get_ident()
+        with self._condition:
+            if self._writer == ident:
+                self._writer_depth += 1
+                return
+
+            if ident in self._readers:
+                raise RuntimeError("Can't start writing while reading, the read lock must be released first")
+
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._writers_waiting -= 1
+
+            self._writer, self._writer_depth = ident, 1
+
+    def release_write(self):
+        with self._condition:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._condition.notify_all()
+
+    @contextmanager
+    def reading(self):
+        self.acquire_read()
+        try:
+            yield self
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def writing(self):
+        self.acquire_write()
+        try:
+            yield self
+        finally:
+            self.release_write()
+
+
 class TitleInformation:
     def __init__(self, world):
         self.world: World = world
@@ -524,7 +605,8 @@ class Window:
         self.name = _dict_info['name']
         self.ranges = _dict_info['ranges']
         self.full_size = _dict_info['full_size']
-        self.inventory.slots = SlotsArray(self.full_size)
+        with self.inventory.lock:
+            self.inventory.slots = SlotsArray(self.full_size)
 
     @property
     def state_id(self):
@@ -546,9 +628,21 @@ class Inventory:
         self.slots = SlotsArray(size=46)
         self.selected_slot = 0
 
+        # Held by the network thread while it changes the slots
+        self.lock = RLock()
+
     def clear(self):
-        del self.slots
-        self.slots = SlotsArray(size=46)
+        with self.lock:
+            self.slots = SlotsArray(size=46)
+
+    def snapshot(self):
+        """
+        :return: copy of the slots taken between two updates of the server, safe to read from any thread
+        """
+        with self.lock:
+            slots = SlotsArray()
+            slots._array = list(self.slots._array)
+            return slots
 
     @staticmethod
     def get_slots_from_type():
@@ -559,12 +653,13 @@ class Inventory:
         return self.slots[self.selected_slot]
 
     def on_window_items(self, window_id, count, slot_data, state_id=None, carried_item=None):
-        if window_id == 0:
-            for index in range(count):
-                _item = slot_data[index]
-                self.slots[index] = _item
+        with self.lock:
+            if window_id == 0:
+                for index in range(count):
+                    _item = slot_data[index]
+                    self.slots[index] = _item
 
-        self.state_id = state_id
+            self.state_id = state_id
 
     def create_window(self, window_id, window_type, window_title):
 
@@ -580,6 +675,456 @@ class EntitiesObject:
 
         self.entities: Dict[int, Entity] = {}
 
+        # Held by the network thread while it adds or moves entities
+        self.lock = RLock()
+
+    def snapshot(self):
+        """
+        :return: dict of entity id to a copy of each entity taken between two updates of the server
+        """
+        with self.lock:
+            return {entity_id: copy.copy(entity) for entity_id, entity in self.entities.items()}
+
+
+_SECTION_HEADER = struct.Struct('>hB')
+
+# Packed data shared by every all-air section placeholder
+_AIR_SECTION_DATA = bytes(4096 // 2)
+
+
+def unpack_varints(data, pos, count, max_bytes=5):
+    """
+    Unpacks a run of unsigned varints without going through the buffer for each byte
+    :param data: bytes containing the varints
+    :param pos: position of the first varint
+    :param count: number of varints to read
+    :param max_bytes: maximum size of each varint, 10 for varlongs
+    :return: list of the values and the position after the last varint
+    """
+    # Fast path when every value fits in a single byte
+    run = data[pos:pos + count]
+    if len(run) == count and run.isascii():
+        return list(run), pos + count
+
+    if count >= 32:
+        # Varints end on the bytes without the continuation bit
+        run = np.frombuffer(data, dtype='uint8', count=min(len(data) - pos, max_bytes * count), offset=pos)
+        ends = np.flatnonzero(run < 0x80)[:count]
+        if len(ends) == count:
+            starts = np.concatenate([[0], ends[:-1] + 1])
+            shifts = 7 * (np.arange(ends[-1] + 1) - np.repeat(starts, ends - starts + 1))
+            values = np.add.reduceat((run[:ends[-1] + 1] & 0x7F).astype('uint64') << shifts.astype('uint64'), starts)
+            return values.tolist(), pos + int(ends[-1]) + 1
+
+    values = []
+    for _ in range(count):
+        value = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+        values.append(value)
+
+    return values, pos
+
+
+def unpack_section_indices(bits_per_block, data_array):
+    """
+    Unpacks the palette indices stored in the longs of a chunk section
+    :param bits_per_block: size of each palette index inside the longs
+    :param data_array: raw big-endian longs of the section
+    :return: uint16 array with the 4096 indices ordered as [y][z][x]
+    """
+    longs = np.frombuffer(data_array, dtype='>u8')
+
+    # Since 1.16 indices do not span across longs, each long holds
+    # (64 // bits_per_block) of them starting from the least significant bit
+    shifts = np.arange(64 // bits_per_block, dtype='uint64') * np.uint64(bits_per_block)
+    mask = np.uint64((1 << bits_per_block) - 1)
+    indices = ((longs[:, None] >> shifts) & mask).ravel()[:4096].astype('uint16')
+
+    if len(indices) < 4096:
+        indices = np.concatenate([indices, np.zeros(4096 - len(indices), dtype='uint16')])
+
+    return indices
+
+
+def decode_section(bits_per_block, palette, data_array):
+    """
+    Decodes the packed longs of a chunk section into block state ids
+    :param bits_per_block: size of each palette index inside the longs
+    :param palette: list of block state ids, empty when the section uses the global palette
+    :param data_array: raw big-endian longs of the section
+    :return: uint16 array of shape (16, 16, 16) indexed as [y][z][x]
+    """
+    block_state_ids = unpack_section_indices(bits_per_block, data_array)
+
+    if len(palette):
+        block_state_ids = np.asarray(palette, dtype='uint16')[block_state_ids]
+
+    return block_state_ids.reshape((16, 16, 16))
+
+
+def unpack_heightmap(data, height=256):
+    """
+    Decodes the packed longs of a heightmap, entries don't span longs (1.16 format)
+    :param data: raw big-endian longs of the heightmap
+    :param height: height of the chunk column, sets the bits of each entry
+    :return: uint16 array of shape (16, 16) indexed as [z][x]
+    """
+    longs = np.frombuffer(data, dtype='>u8')
+
+    bits = height.bit_length()
+    if -(-256 // (64 // bits)) != len(longs):
+        # Fall back to the narrowest entries that fit 256 values in the longs that were sent
+        bits = next(bits for bits in range(1, 33) if -(-256 // (64 // bits)) <= len(longs))
+
+    per_long = 64 // bits
+    shifts = np.arange(per_long, dtype='uint64') * np.uint64(bits)
+    values = (longs[:, None] >> shifts) & np.uint64((1 << bits) - 1)
+
+    return values.ravel()[:256].astype('uint16').reshape((16, 16))
+
+
+def _group_by(keys):
+    """
+    Groups the positions of an array by their value
+    :param keys: array of ints
+    :return: generator of (key, array of positions with that key)
+    """
+    if not len(keys):
+        return
+
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.cumsum(np.bincount(inverse, minlength=len(unique_keys)))[:-1]
+
+    for key, positions in zip(unique_keys.tolist(), np.split(order, bounds)):
+        yield key, positions
+
+
+class ChunkSection:
+    """
+    16x16x16 blocks stored as a palette of block state ids plus one index per block.
+
+    Indices are packed two per byte while the palette fits in 4 bits, take a whole
+    byte up to 256 entries and past that the section stores the state ids directly.
+    Blocks are addressed by their flat index (y << 8) | (z << 4) | x
+    """
+
+    def __init__(self, palette, indices=None):
+        self.palette = list(palette)
+        self._palette_ids = {}
+        for index, block_state_id in enumerate(self.palette):
+            self._palette_ids.setdefault(block_state_id, index)
+
+        # None means every block is palette[0]
+        self._data = None
+        self.bits = 0
+
+        if indices is not None:
+            self._store(np.asarray(indices))
+
+    @classmethod
+    def from_data(cls, bits_per_block, palette, data_array):
+        # Single valued sections (like the all-air ones) are never unpacked
+        if len(palette) == 1:
+            return cls(palette)
+
+        indices = unpack_section_indices(bits_per_block, data_array)
+        if not len(palette):
+            return cls.from_states(indices)
+
+        return cls(palette, indices)
+
+    @classmethod
+    def from_states(cls, block_state_ids):
+        palette, indices = np.unique(np.asarray(block_state_ids).ravel(), return_inverse=True)
+        if len(palette) == 1:
+            return cls(palette.tolist())
+
+        return cls(palette.tolist(), indices)
+
+    def _store(self, indices):
+        if len(self.palette) <= 16:
+            indices = indices.astype('uint8')
+            self._data = indices[0::2] | (indices[1::2] << 4)
+            self.bits = 4
+        elif len(self.palette) <= 256:
+            self._data = indices.astype('uint8')
+            self.bits = 8
+        else:
+            # Global palette, the section keeps the block state ids themselves
+            self._data = np.asarray(self.palette, dtype='uint16')[indices]
+            self.bits = 16
+            self.palette, self._palette_ids = [], {}
+
+    def _indices(self):
+        if self._data is None:
+            return np.zeros(4096, dtype='uint16')
+
+        if self.bits == 4:
+            indices = np.empty(4096, dtype='uint8')
+            indices[0::2] = self._data & 0x0F
+            indices[1::2] = self._data >> 4
+            return indices
+
+        return self._data
+
+    def _palette_index(self, block_state_id):
+        index = self._palette_ids.get(block_state_id, None)
+        if index is not None:
+            return index
+
+        capacity = {0: 16, 4: 16, 8: 256}.get(self.bits, None)
+        if capacity is not None and len(self.palette) >= capacity:
+            # Entries of replaced blocks are dropped before moving to a wider index
+            used, indices = np.unique(self._indices(), return_inverse=True)
+            self.palette = [self.palette[i] for i in used]
+            self._palette_ids = {block_state_id: i for i, block_state_id in enumerate(self.palette)}
+            self._store(indices)
+            # The compacted palette may fit in fewer bits than before
+            capacity = {0: 16, 4: 16, 8: 256}.get(self.bits, None)
+
+        index = self._palette_ids[block_state_id] = len(self.palette)
+        self.palette.append(block_state_id)
+
+        if capacity is not None and len(self.palette) > capacity:
+            self._store(self._indices())
+
+        return index
+
+    def get(self, index):
+        if self._data is None:
+            return self.palette[0]
+
+        if self.bits == 4:
+            return self.palette[(self._data[index >> 1] >> ((index & 1) << 2)) & 0x0F]
+
+        if self.bits == 8:
+            return self.palette[self._data[index]]
+
+        return self._data[index]
+
+    def set(self, index, block_state_id):
+        if self.bits == 16:
+            self._data[index] = block_state_id
+            return
+
+        palette_index = self._palette_index(block_state_id)
+        if self.bits == 16:
+            self._data[index] = block_state_id
+            return
+
+        if self._data is None:
+            if palette_index == 0:
+                return
+            self._store(np.zeros(4096, dtype='uint8'))
+
+        if self.bits == 4:
+            shift = (index & 1) << 2
+            self._data[index >> 1] = (self._data[index >> 1] & (0xF0 >> shift)) | (palette_index << shift)
+        else:
+            self._data[index] = palette_index
+
+    @property
+    def single_value(self):
+        """
+        Block state id of every block when the section has a single one, None otherwise
+        """
+        return self.palette[0] if self._data is None else None
+
+    def counts(self):
+        """
+        :return: dict of block state id to number of blocks with it
+        """
+        if self._data is None:
+            return {self.palette[0]: 4096}
+
+        if self.bits == 16:
+            states, counts = np.unique(self._data, return_counts=True)
+            return dict(zip(states.tolist(), counts.tolist()))
+
+        block_counts = {}
+        for palette_index, count in enumerate(np.bincount(self._indices(), minlength=len(self.palette)).tolist()):
+            if count:
+                block_state_id = self.palette[palette_index]
+                block_counts[block_state_id] = block_counts.get(block_state_id, 0) + count
+
+        return block_counts
+
+    def find(self, block_state_ids):
+        """
+        :return: array of the flat indices of the blocks with any of the given block state ids
+        """
+        if self._data is None:
+            return np.arange(4096) if self.palette[0] in block_state_ids else np.empty(0, dtype='int64')
+
+        if self.bits == 16:
+            return np.flatnonzero(np.isin(self._data, list(block_state_ids)))
+
+        palette_indices = [index for index, state in enumerate(self.palette) if state in block_state_ids]
+        return np.flatnonzero(np.isin(self._indices(), palette_indices))
+
+    def get_many(self, indices):
+        """
+        Vectorized get, block state ids of an array of flat indices
+        """
+        indices = np.asarray(indices)
+
+        if self._data is None:
+            return np.full(len(indices), self.palette[0], dtype='uint16')
+
+        if self.bits == 16:
+            return self._data[indices]
+
+        if self.bits == 4:
+            palette_indices = (self._data[indices >> 1] >> ((indices & 1) << 2).astype('uint8')) & 0x0F
+        else:
+            palette_indices = self._data[indices]
+
+        return np.asarray(self.palette, dtype='uint16')[palette_indices]
+
+    def set_many(self, indices, block_state_ids):
+        """
+        Vectorized set, writes every block state id at the matching flat index in one scatter
+        """
+        indices = np.asarray(indices)
+        block_state_ids = np.asarray(block_state_ids, dtype='uint16')
+
+        if self.bits == 16:
+            self._data[indices] = block_state_ids
+            return
+
+        states, inverse = np.unique(block_state_ids, return_inverse=True)
+        new_states = [state for state in states.tolist() if state not in self._palette_ids]
+
+        capacity = {0: 16, 4: 16, 8: 256}[self.bits]
+        if len(self.palette) + len(new_states) > capacity:
+            # Rebuilding the section also drops the entries that are not used anymore
+            block_states = self.to_array().ravel()
+            block_states[indices] = block_state_ids
+            palette, all_indices = np.unique(block_states, return_inverse=True)
+            self.palette = palette.tolist()
+            self._palette_ids = {block_state_id: i for i, block_state_id in enumerate(self.palette)}
+            if len(self.palette) == 1:
+                self._data, self.bits = None, 0
+            else:
+                self._store(all_indices)
+            return
+
+        for state in new_states:
+            self._palette_ids[state] = len(self.palette)
+            self.palette.append(state)
+
+        palette_indices = np.asarray([self._palette_ids[state] for state in states.tolist()], dtype='uint8')[inverse]
+        if self.bits == 8:
+            self._data[indices] = palette_indices
+            return
+
+        all_indices = self._indices() if self._data is not None else np.zeros(4096, dtype='uint8')
+        all_indices[indices] = palette_indices
+        self._store(all_indices)
+
+    def to_array(self):
+        if self._data is None:
+            return np.full((16, 16, 16), self.palette[0], dtype='uint16')
+
+        if self.bits == 16:
+            return self._data.reshape((16, 16, 16)).copy()
+
+        return np.asarray(self.palette, dtype='uint16')[self._indices()].reshape((16, 16, 16))
+
+    @property
+    def nbytes(self):
+        # Palette counted as the uint16 it would take in an array
+        return (0 if self._data is None else self._data.nbytes) + 2 * len(self.palette)
+
+
+class BlockIndex:
+    """
+    Sections where each block state id can be found, keyed by (chunk_x, section_index, chunk_z),
+    with the number of blocks of that state. Sections that are not decoded yet are
+    listed from their palette with an unknown (None) number of blocks
+    """
+
+    def __init__(self):
+        self._sections: Dict[int, Dict[tuple, int]] = {}
+        self._section_counts: Dict[tuple, Dict[int, int]] = {}
+        self._chunk_sections: Dict[tuple, set] = {}
+
+        # Sections are indexed by whichever thread decodes them, nothing else is locked while holding it
+        self._lock = RLock()
+
+    def set_counts(self, key, counts):
+        with self._lock:
+            self.remove_section(key)
+
+            self._section_counts[key] = counts
+            self._chunk_sections.setdefault((key[0], key[2]), set()).add(key)
+            for block_state_id, count in counts.items():
+                self._sections.setdefault(block_state_id, {})[key] = count
+
+    def add_section(self, key, section: ChunkSection):
+        self.set_counts(key, section.counts())
+
+    def add_palette(self, key, palette):
+        self.set_counts(key, dict.fromkeys(palette))
+
+    def remove_section(self, key):
+        with self._lock:
+            for block_state_id in self._section_counts.pop(key, ()):
+                sections = self._sections[block_state_id]
+                sections.pop(key, None)
+                if not sections:
+                    del self._sections[block_state_id]
+
+            self._chunk_sections.get((key[0], key[2]), set()).discard(key)
+
+    def remove_chunk(self, chunk_x, chunk_z):
+        with self._lock:
+            for key in self._chunk_sections.pop((chunk_x, chunk_z), ()):
+                self.remove_section(key)
+
+    def move(self, key, old_block_state_id, new_block_state_id):
+        """
+        Updates the counts of a section after one of its blocks changed
+        """
+        with self._lock:
+            counts = self._section_counts.get(key, None)
+            if counts is None or old_block_state_id == new_block_state_id:
+                return
+
+            if counts.get(old_block_state_id, None) is not None:
+                counts[old_block_state_id] -= 1
+                if counts[old_block_state_id]:
+                    self._sections[old_block_state_id][key] = counts[old_block_state_id]
+                else:
+                    del counts[old_block_state_id]
+                    del self._sections[old_block_state_id][key]
+                    if not self._sections[old_block_state_id]:
+                        del self._sections[old_block_state_id]
+
+            if new_block_state_id not in counts or counts[new_block_state_id] is not None:
+                counts[new_block_state_id] = counts.get(new_block_state_id, 0) + 1
+                self._sections.setdefault(new_block_state_id, {})[key] = counts[new_block_state_id]
+
+    def sections_with(self, block_state_id):
+        """
+        :return: copy of the dict of section key to number of blocks with that state (None if not known yet)
+        """
+        with self._lock:
+            return dict(self._sections.get(block_state_id, {}))
+
+    def clear(self):
+        with self._lock:
+            self._sections.clear()
+            self._section_counts.clear()
+            self._chunk_sections.clear()
+
 
 class Chunk:
     def __init__(self,
@@ -590,9 +1135,10 @@ class Chunk:
                  height_maps,
                  biomes,
                  data,
-                 block_entities):
+                 block_entities,
+                 sections=None):
 
-        self.built = False
+        self.built = True
         self.chunks = chunks
 
         self.chunk_x = chunk_x
@@ -606,92 +1152,401 @@ class Chunk:
         self.data = data
         self.block_entities = block_entities
 
+        # Columns always hold at least 16 sections, missing ones on top are air.
+        # Each item stays None until the section is first read or written
+        self._sections = sections or [None] * len(data) + [ChunkSection([0]) for _ in range(16 - len(data))]
+        self._nbytes = None
+        self._heights = None
+
+        # Readers decode sections lazily, the lock makes sure each one is only decoded once
+        self._lock = RLock()
+
+    @property
+    def height(self):
+        return len(self._sections) * 16
+
     @property
     def blocks(self):
+        """
+        Read only copy of the whole column as a (height, 16, 16) uint16 array,
+        changes to the chunk must go through set_block
+        """
         if self._blocks is None:
             return self._compute_data_to_blocks()
 
         return self._blocks
 
+    @property
+    def air_block_state_ids(self):
+        return self.chunks.air_block_state_ids if self.chunks is not None else {0}
+
+    @property
+    def heights(self):
+        """
+        (16, 16) uint16 array indexed as [z][x] of the y above the highest motion blocking
+        block of each column, decoded from the MOTION_BLOCKING heightmap sent with the chunk
+        and kept up to date by set_block and set_blocks
+        """
+        if self._heights is not None:
+            return self._heights
+
+        with self._lock:
+            if self._heights is not None:
+                return self._heights
+
+            height_maps = getattr(self.height_map, 'body', None)
+            motion_blocking = height_maps.value.get('MOTION_BLOCKING', None) if height_maps is not None else None
+
+            if motion_blocking is not None:
+                self._heights = unpack_heightmap(motion_blocking.value.to_bytes(), self.height)
+            else:
+                # No heightmap was sent, falls back to scanning the blocks once
+                solid = ~np.isin(self.blocks, list(self.air_block_state_ids))
+                self._heights = np.where(
+                    solid.any(axis=0), self.height - np.argmax(solid[::-1], axis=0), 0).astype('uint16')
+
+        return self._heights
+
+    def _surface_below(self, x, y, z):
+        """
+        :return: y above the highest non air block of a column at or under y, 0 if there is none
+        """
+        air_block_state_ids = self.air_block_state_ids
+
+        for section_index in range(min(y, self.height - 1) >> 4, -1, -1):
+            _section = self.section(section_index)
+            if _section.single_value in air_block_state_ids:
+                continue
+
+            top = min(y - section_index * 16, 15)
+            states = _section.get_many((np.arange(top, -1, -1) << 8) | (z << 4) | x)
+            solid = np.flatnonzero(~np.isin(states, list(air_block_state_ids)))
+            if len(solid):
+                return section_index * 16 + top - int(solid[0]) + 1
+
+        return 0
+
+    def _surfaces_below(self, x, y, z):
+        """
+        Vectorized _surface_below, each section is read once for all the columns still looking for their surface
+        :param x, y, z: arrays of the columns and of the y each one is read from
+        """
+        air_block_state_ids = list(self.air_block_state_ids)
+        y = np.minimum(y, self.height - 1)
+        surfaces = np.zeros(len(x), dtype='int64')
+        pending = np.flatnonzero(y >= 0)
+        offsets = np.arange(15, -1, -1)
+
+        for section_index in range(int(y.max(initial=-1)) >> 4, -1, -1):
+            columns = pending[(y[pending] >> 4) >= section_index]
+            if not len(columns):
+                continue
+
+            _section = self.section(section_index)
+            if _section.single_value in self.air_block_state_ids:
+                continue
+
+            # One row of the 16 blocks of the section from the top for each column
+            states = _section.get_many(
+                ((offsets << 8)[None, :] | ((z[columns] << 4) | x[columns])[:, None]).ravel()).reshape((-1, 16))
+            # Blocks over the y a column is read from are ignored
+            solid = ~np.isin(states, air_block_state_ids) & (section_index * 16 + offsets <= y[columns][:, None])
+
+            found = solid.any(axis=1)
+            surfaces[columns[found]] = section_index * 16 + 16 - solid[found].argmax(axis=1)
+            pending = np.setdiff1d(pending, columns[found], assume_unique=True)
+
+        return surfaces
+
+    def _update_height(self, x, y, z, block_state_id):
+        heights = self.heights
+        if y + 1 < heights[z, x]:
+            # Changes under the surface don't move it
+            return
+
+        if block_state_id not in self.air_block_state_ids:
+            heights[z, x] = y + 1
+        elif y + 1 == heights[z, x]:
+            heights[z, x] = self._surface_below(x, y - 1, z)
+
+    def section(self, index) -> ChunkSection:
+        """
+        Decodes (only once) and returns a section of the chunk
+        :param index: section index, chunk y // 16
+        """
+        _section = self._sections[index]
+        if _section is not None:
+            return _section
+
+        with self._lock:
+            _section = self._sections[index]
+            if _section is None:
+                _section = ChunkSection.from_data(*self.data[index][1:])
+
+                block_index = getattr(self.chunks, 'block_index', None)
+                if block_index is not None:
+                    block_index.add_section((self.chunk_x, index, self.chunk_z), _section)
+
+                self._sections[index] = _section
+
+                # The packet bytes are not needed anymore
+                self.data[index] = None
+                self._nbytes = None
+
+        return _section
+
+    def get_block(self, x, y, z):
+        """
+        Block state id at the chunk relative coordinates, None if y is out of the chunk
+        """
+        if not 0 <= y < self.height:
+            return None
+
+        return self.section(y >> 4).get(((y & 15) << 8) | (z << 4) | x)
+
+    def set_block(self, x, y, z, block_state_id):
+        if not 0 <= y < self.height:
+            return
+
+        _section, index = self.section(y >> 4), ((y & 15) << 8) | (z << 4) | x
+
+        block_index = getattr(self.chunks, 'block_index', None)
+        if block_index is not None:
+            block_index.move((self.chunk_x, y >> 4, self.chunk_z), _section.get(index), block_state_id)
+
+        _section.set(index, block_state_id)
+        self._update_height(x, y, z, block_state_id)
+        self._blocks = None
+        self._nbytes = None
+
+    def get_blocks(self, x, y, z, fill=-1):
+        """
+        Vectorized get_block, reads each section once with a single gather
+        :param x: array of chunk relative x coordinates
+        :param y: array of y coordinates
+        :param z: array of chunk relative z coordinates
+        :param fill: value returned for y outside of the chunk
+        :return: int32 array of block state ids
+        """
+        x, y, z = (np.asarray(array, dtype='int64') for array in (x, y, z))
+        block_state_ids = np.full(len(x), fill, dtype='int32')
+
+        inside = np.flatnonzero((0 <= y) & (y < self.height))
+        section_indices = y[inside] >> 4
+        for section_index, positions in _group_by(section_indices):
+            positions = inside[positions]
+            block_state_ids[positions] = self.section(section_index).get_many(
+                ((y[positions] & 15) << 8) | (z[positions] << 4) | x[positions])
+
+        return block_state_ids
+
+    def get_region(self, x0, y0, z0, x1, y1, z1, fill=-1):
+        """
+        Copies a box of the chunk, one slice per section
+        :param x0, z0, x1, z1: chunk relative corners (0 to 15, both included)
+        :param y0, y1: y corners (both included), layers outside the chunk get the fill value
+        :return: int32 array of shape (y1 - y0 + 1, z1 - z0 + 1, x1 - x0 + 1) indexed as [y][z][x]
+        """
+        region = np.full((y1 - y0 + 1, z1 - z0 + 1, x1 - x0 + 1), fill, dtype='int32')
+
+        for section_index in range(max(y0, 0) >> 4, (min(y1, self.height - 1) >> 4) + 1):
+            section_y0, section_y1 = max(y0, section_index * 16), min(y1, section_index * 16 + 15)
+            _section = self.section(section_index)
+
+            if _section.single_value is not None:
+                region[section_y0 - y0:section_y1 - y0 + 1] = _section.single_value
+                continue
+
+            region[section_y0 - y0:section_y1 - y0 + 1] = \
+                _section.to_array()[section_y0 & 15:(section_y1 & 15) + 1, z0:z1 + 1, x0:x1 + 1]
+
+        return region
+
+    def find(self, block_state_ids, section_index):
+        """
+        :return: (N, 3) array of the world coordinates of the blocks of a section with any of the given states
+        """
+        indices = self.section(section_index).find(block_state_ids)
+
+        return np.column_stack([
+            self.chunk_x * 16 + (indices & 15),
+            section_index * 16 + (indices >> 8),
+            self.chunk_z * 16 + ((indices >> 4) & 15)
+        ])
+
+    def set_blocks(self, x, y, z, block_state_ids):
+        """
+        Vectorized set_block, applies all the changes of each section in a single scatter
+        :param x: array of chunk relative x coordinates
+        :param y: array of y coordinates
+        :param z: array of chunk relative z coordinates
+        :param block_state_ids: array of the new block state ids
+        """
+        x, y, z, block_state_ids = (np.asarray(array, dtype='int64') for array in (x, y, z, block_state_ids))
+
+        inside = (0 <= y) & (y < self.height)
+        x, y, z, block_state_ids = x[inside], y[inside], z[inside], block_state_ids[inside]
+
+        block_index = getattr(self.chunks, 'block_index', None)
+
+        for section_index, positions in _group_by(y >> 4):
+            _section = self.section(section_index)
+            _section.set_many(
+                ((y[positions] & 15) << 8) | (z[positions] << 4) | x[positions],
+                block_state_ids[positions])
+
+            # Counting the whole section again also handles the same block changing twice
+            if block_index is not None:
+                block_index.add_section((self.chunk_x, section_index, self.chunk_z), _section)
+
+        # Only the columns changed at or above their surface need to be looked at again,
+        # from the highest of their old surface and their highest change
+        heights = self.heights
+        columns = (z << 4) | x
+        reaching = y + 1 >= heights.ravel()[columns]
+        if reaching.any():
+            reaching_columns, inverse = np.unique(columns[reaching], return_inverse=True)
+            tops = heights.ravel()[reaching_columns].astype('int64') - 1
+            np.maximum.at(tops, inverse, y[reaching])
+            heights[reaching_columns >> 4, reaching_columns & 15] = self._surfaces_below(
+                reaching_columns & 15, tops, reaching_columns >> 4)
+
+        self._blocks = None
+        self._nbytes = None
+
+    @property
+    def nbytes(self):
+        """
+        Bytes held by the decoded sections plus the packet data of the ones not decoded yet
+        """
+        if self._nbytes is None:
+            self._nbytes = sum(len(self.data[index][3]) if _section is None else _section.nbytes
+                               for index, _section in enumerate(self._sections))
+
+        return self._nbytes
+
     def _compute_data_to_blocks(self):
 
-        block_state_ids = []
-        for non_air_blocks, bits_per_block, palette, data_array in self.data:
-            offset = 64 % bits_per_block
-            stream = BitStream(data_array)
-            bits_per_long = 64 // bits_per_block
-
-            # Variable needed because depending on the bits_per_block
-            # the last long could contain more information than needed (ex. needs more 5 blocks to reach 4096 but has
-            #                                                           more bits than 5 * bits_per_block)
-            added_blocks = 0
-            for i in range(stream.length // 64):  # Looping through each long in the data_array
-                long_bit_stream = BitStream(stream.read(64))  # reads a whole long
-                long_bit_stream.reverse()
-
-                for _ in range(bits_per_long):
-                    index = long_bit_stream.read(bits_per_block)
-                    index.reverse()
-                    if added_blocks < 4096:
-                        block_state_ids.append(palette[index.uint])
-                        added_blocks += 1
-
-                long_bit_stream.read(offset)  # offset to fit block information into 64 bits (8bytes aka Long)
-
-        block_state_ids.extend(0 for _ in range((16 ** 4) - len(block_state_ids)))
-        self._blocks = np.concatenate(
-            [
-                # This splits the blocks array into 16x16x16 blocks (4096 blocks)
-                # and then concatenates in the y axis for easy access
-                # (chunk.blocks[ANY_Y_VALUE][Z from 0 to 16][X from 0 to 16])
-                np.array(block_state_ids[i * 4096: (i + 1) * 4096], dtype='uint16').reshape((16, 16, 16)) for i in range(len(block_state_ids) // 4096)
-            ]
-        )
-        self.built = True
+        # Sections are stacked in the y axis for easy access
+        # (chunk.blocks[ANY_Y_VALUE][Z from 0 to 16][X from 0 to 16])
+        self._blocks = np.concatenate([self.section(index).to_array() for index in range(len(self._sections))])
+        self._blocks.flags.writeable = False
 
         return self._blocks
 
 
 class Chunks:
 
-    def __init__(self, world):
+    def __init__(self, world, memory_budget=None, radius=None):
         self.world = world
-        self._chunks: Dict[tuple, Chunk] = {}
+        # Ordered from least to most recently used
+        self._chunks: Dict[tuple, Chunk] = OrderedDict()
         self._computing_queue_status = False
         self._computing_queue = []
 
         self.processing_new_chunks: bool = False
         self.chunks_to_process = []
 
+        self._decoding_pool = None
+
+        # Maximum bytes held by the chunks before evicting the least recently used ones
+        self.memory_budget = memory_budget
+        # Maximum distance (in chunks) from the player before chunks are evicted
+        self.radius = radius
+        self.evictions = 0
+
+        self.block_index: BlockIndex = None
+        # Block states ignored by the chunk heightmaps
+        self.air_block_state_ids = {0}
+
+        # The network thread writes blocks and chunks while other threads read them,
+        # reads that span several blocks or chunks hold the read side to see them all at once
+        self.lock = RWLock()
+        # Short changes to the chunks dict and the chunk being loaded by each thread
+        self._mutex = RLock()
+        self._loading: Dict[tuple, Lock] = {}
+
     def clear(self):
-        self._chunks: Dict[tuple, Chunk] = {}
-        self._computing_queue_status = False
-        self._computing_queue = []
-        self.processing_new_chunks: bool = False
-        self.chunks_to_process = []
+        with self.lock.writing(), self._mutex:
+            self._chunks: Dict[tuple, Chunk] = OrderedDict()
+            if self.block_index is not None:
+                self.block_index.clear()
+            self._computing_queue_status = False
+            self._computing_queue = []
+            self.processing_new_chunks: bool = False
+            self.chunks_to_process = []
 
     def __getitem__(self, chunk_x_z) -> Chunk:
-        _chunk = self._chunks.get(chunk_x_z, None)
-        if type(_chunk) is bytes:
-            self.load_new_chunk(*self.unpack_chunk_data(Buffer1_14(_chunk)))
-        return self._chunks.get(chunk_x_z, None)
+        with self._mutex:
+            _chunk = self._chunks.get(chunk_x_z, None)
+            if _chunk is None:
+                return None
+
+            self._chunks.move_to_end(chunk_x_z)
+
+        if type(_chunk) is not Chunk:
+            _chunk = self._load(chunk_x_z)
+        return _chunk
+
+    def _load(self, chunk_x_z):
+        """
+        Turns the packet bytes or the pending decode of a chunk into a Chunk,
+        only the first thread asking for it does the work, the others wait for it
+        """
+        while True:
+            with self._mutex:
+                _chunk = self._chunks.get(chunk_x_z, None)
+                if _chunk is None or type(_chunk) is Chunk:
+                    return _chunk
+
+                loading = self._loading.setdefault(chunk_x_z, Lock())
+
+            with loading:
+                try:
+                    with self._mutex:
+                        if self._chunks.get(chunk_x_z, None) is not _chunk:
+                            # Loaded by another thread or replaced by a newer packet
+                            continue
+
+                    try:
+                        if type(_chunk) is bytes:
+                            chunk_data, sections = self.unpack_chunk_data(Buffer1_14(_chunk)), None
+                        else:
+                            # Only blocks when the chunk is still being decoded by the pool
+                            chunk_data, sections = _chunk.result()
+                    except CancelledError:
+                        continue
+
+                    with self._mutex:
+                        if self._chunks.get(chunk_x_z, None) is _chunk:
+                            self.load_new_chunk(*chunk_data, sections=sections)
+                finally:
+                    # Also when the decode was cancelled or failed, the threads waiting on it start over
+                    with self._mutex:
+                        if self._loading.get(chunk_x_z, None) is loading:
+                            del self._loading[chunk_x_z]
 
     def get_block(self, x, y, z):
-        chunk_x, chunk_z = x // 16, z // 16
-        if self[chunk_x, chunk_z] and self[chunk_x, chunk_z].built:
-            return self[chunk_x, chunk_z].blocks[y][z % 16][x % 16]
+        with self.lock.reading():
+            chunk = self[x // 16, z // 16]
+            if chunk and chunk.built:
+                return chunk.get_block(x % 16, y, z % 16)
         return None
 
     def new_block_change(self, x, y, z, block_id):
-        chunk_x, chunk_z = x // 16, z // 16
-        if self[chunk_x, chunk_z] and self[chunk_x, chunk_z].built:
-            self[chunk_x, chunk_z].blocks[y][z % 16][x % 16] = block_id
+        with self.lock.writing():
+            chunk = self[x // 16, z // 16]
+            if chunk and chunk.built:
+                chunk.set_block(x % 16, y, z % 16, block_id)
 
     def new_multi_block_change(self, chunk_x, chunk_y, chunk_z, blocks):
-        if self[chunk_x, chunk_z] and self[chunk_x, chunk_z].built:
-            y_factor = chunk_y * 16
-            for block_state_id, (x, y, z) in blocks:
-                self[chunk_x, chunk_z].blocks[y + y_factor][z][x] = block_state_id
+        """
+        :param blocks: (N, 4) array of (block_state_id, x, y, z) relative to the chunk section
+        """
+        with self.lock.writing():
+            chunk = self[chunk_x, chunk_z]
+            if chunk and chunk.built:
+                chunk.set_blocks(blocks[:, 1], blocks[:, 2] + chunk_y * 16, blocks[:, 3], blocks[:, 0])
 
     @thread
     def _compute_blocks(self):
@@ -724,9 +1579,10 @@ class Chunks:
                        height_maps,
                        biomes,
                        data,
-                       block_entities):
+                       block_entities,
+                       sections=None):
 
-        self._chunks[(chunk_x, chunk_z)] = Chunk(
+        chunk = Chunk(
             self,
             chunk_x,
             chunk_z,
@@ -734,56 +1590,101 @@ class Chunks:
             height_maps,
             biomes,
             data,
-            block_entities
+            block_entities,
+            sections
         )
 
-    def unpack_chunk_data(self, buff: Buffer1_14):
+        with self._mutex:
+            if self.block_index is not None:
+                self.block_index.remove_chunk(chunk_x, chunk_z)
+                self._index_chunk(chunk)
+
+            self._chunks[(chunk_x, chunk_z)] = chunk
+
+    def _index_chunk(self, chunk: Chunk):
+        for index, _section in enumerate(chunk._sections):
+            if _section is not None:
+                self.block_index.add_section((chunk.chunk_x, index, chunk.chunk_z), _section)
+            elif len(chunk.data[index][2]):
+                self.block_index.add_palette((chunk.chunk_x, index, chunk.chunk_z), chunk.data[index][2])
+            else:
+                # Sections without palette could hold any block, decoding also indexes them
+                chunk.section(index)
+
+    def enable_block_index(self):
+        """
+        Starts keeping a BlockIndex of the loaded chunks, needed by World.find_blocks.
+        Chunk packets are parsed (but not decoded) as soon as they arrive while it is enabled
+        """
+        with self._mutex:
+            if self.block_index is not None:
+                return
+
+            self.block_index = BlockIndex()
+            for _chunk in list(self._chunks.values()):
+                if type(_chunk) is Chunk:
+                    self._index_chunk(_chunk)
+
+            raw_chunks = [chunk_x_z for chunk_x_z, _chunk in self._chunks.items() if type(_chunk) is bytes]
+
+        # Loading takes the per chunk locks, they are never waited for while holding the mutex
+        for chunk_x_z in raw_chunks:
+            self[chunk_x_z]
+
+    def _load_decoded_chunk(self, future: Future):
+        # Called by the pool once the chunk is decoded
+        if not future.cancelled() and future.exception() is None:
+            chunk_data, _ = future.result()
+            self._load((chunk_data[0], chunk_data[1]))
+
+    @staticmethod
+    def unpack_chunk_data(buff: Buffer1_14):
         chunk_x, chunk_z = buff.unpack('ii')
 
         bit_mask_length = buff.unpack_varint()
         primary_bit_mask = buff.unpack_array('q', bit_mask_length)
-        bit_mask = BitStream()
-        if primary_bit_mask:
-            bit_mask = BitStream(', '.join(['0b' + bin(v)[2:].rjust(32, '0') for v in primary_bit_mask]))
-            bit_mask.reverse()
+        bit_mask = 0
+        for index, value in enumerate(primary_bit_mask):
+            bit_mask |= (value & 0xFFFFFFFFFFFFFFFF) << (64 * index)
 
         height_maps = buff.unpack_nbt()
-        biomes_length = buff.unpack_varint()
-        biomes = []
-        for _ in range(biomes_length):
-            biomes.append(buff.unpack_varint())
 
-        size = buff.unpack_varint()
-        _size_counter = buff.pos
+        packet, pos = buff.buff, buff.pos
+        biomes_length, pos = unpack_varints(packet, pos, 1)
+        biomes, pos = unpack_varints(packet, pos, biomes_length[0])
+
+        size, pos = unpack_varints(packet, pos, 1)
+        end = pos + size[0]
+
+        # Section data arrays are slices of the packet instead of copies
+        packet_view = memoryview(packet)
 
         data = []
-        while (buff.pos - _size_counter) < size:
-            try:
-                if not bit_mask.read(1).uint:
-                    data.append((0, 4, [0], b'\x00' * (4096 // 2)))
-                    continue
-            except Exception as ex:
-                (lambda *args, **kwargs: None)()
+        while pos < end:
+            # Sections past the sent mask are read as present
+            if len(data) < 64 * bit_mask_length and not bit_mask >> len(data) & 1:
+                data.append((0, 4, [0], _AIR_SECTION_DATA))
+                continue
 
-            non_air_blocks = buff.unpack('h')
-            bits_per_block = buff.unpack('B')
+            non_air_blocks, bits_per_block = _SECTION_HEADER.unpack_from(packet, pos)
+            pos += _SECTION_HEADER.size
 
             bits_per_block = 4 if bits_per_block <= 4 else bits_per_block
 
-            palette_length = buff.unpack_varint()
-
+            # Sections using the global palette (more than 8 bits per block) do not send one
             palette = []
-            for _ in range(palette_length):
-                palette.append(buff.unpack_varint())
+            if bits_per_block <= 8:
+                palette_length, pos = unpack_varints(packet, pos, 1)
+                palette, pos = unpack_varints(packet, pos, palette_length[0])
 
-            data_array_length = buff.unpack_varint()  # \x80\x02
+            data_array_length, pos = unpack_varints(packet, pos, 1)
 
-            # data_array = buff.unpack_array('q', data_array_length)
-            data_array = buff.read(8 * data_array_length)
+            data_array = packet_view[pos:pos + 8 * data_array_length[0]]
+            pos += 8 * data_array_length[0]
 
-            data.append((non_air_blocks, bits_per_block, palette.copy(), data_array))
-        #data.extend(buff.unpack_chunk(bit_mask.uint))
+            data.append((non_air_blocks, bits_per_block, palette, data_array))
 
+        buff.pos = pos
         number_of_block_entities = buff.unpack_varint()
 
         block_entities = []
@@ -812,7 +1713,159 @@ class Chunks:
 
     def new_chunk_data(self, buffer: bytes):
         chunk_x, chunk_z = Buffer1_14(buffer).unpack('ii')
-        self._chunks[(chunk_x, chunk_z)] = buffer
+
+        with self.lock.writing():
+            if self._decoding_pool is None:
+                with self._mutex:
+                    self._chunks[(chunk_x, chunk_z)] = buffer
+                    self._chunks.move_to_end((chunk_x, chunk_z))
+                if self.block_index is not None:
+                    self[chunk_x, chunk_z]
+                return self.evict()
+
+            future = self._decoding_pool.submit(_decode_chunk_packet, buffer)
+            with self._mutex:
+                self._chunks[(chunk_x, chunk_z)] = future
+                self._chunks.move_to_end((chunk_x, chunk_z))
+            future.add_done_callback(self._load_decoded_chunk)
+
+            return self.evict()
+
+    def start_decoding_pool(self, max_workers=None, processes=False, executor=None):
+        """
+        Enables eager decoding, new chunk packets are unpacked and
+        decoded into blocks by a pool instead of the first reader
+        :param max_workers: number of workers of the pool
+        :param processes: uses a ProcessPoolExecutor instead of threads
+        :param executor: already configured executor to use instead of creating one
+        """
+        if executor is None:
+            executor = [ThreadPoolExecutor, ProcessPoolExecutor][bool(processes)](max_workers=max_workers)
+
+        self._decoding_pool = executor
+
+    def stop_decoding_pool(self, wait_pending=True):
+        if self._decoding_pool is None:
+            return
+
+        self._decoding_pool.shutdown(wait=wait_pending)
+        self._decoding_pool = None
+
+    @property
+    def pending_chunks(self):
+        return [_chunk for _chunk in list(self._chunks.values()) if isinstance(_chunk, Future) and not _chunk.done()]
+
+    @staticmethod
+    def _chunk_nbytes(_chunk):
+        if type(_chunk) is bytes:
+            return len(_chunk)
+
+        # Chunks still being decoded are not accounted for
+        return _chunk.nbytes if type(_chunk) is Chunk else 0
+
+    @property
+    def bytes_held(self):
+        return sum(self._chunk_nbytes(_chunk) for _chunk in list(self._chunks.values()))
+
+    def remove_chunk(self, chunk_x, chunk_z):
+        with self.lock.writing(), self._mutex:
+            _chunk = self._chunks.pop((chunk_x, chunk_z), None)
+            if isinstance(_chunk, Future):
+                _chunk.cancel()
+
+            if self.block_index is not None:
+                self.block_index.remove_chunk(chunk_x, chunk_z)
+
+        return _chunk
+
+    def evict(self):
+        """
+        Drops the chunks farther than `radius` from the player and then the least
+        recently used ones until the chunks fit in `memory_budget`
+        :return: number of evicted chunks
+        """
+        with self.lock.writing():
+            return self._evict()
+
+    def _evict(self):
+        evicted = 0
+
+        player = getattr(self.world.quarry_client, 'player', None) if self.radius is not None else None
+        if player is not None and player.x is not None and player.z is not None:
+            player_chunk_x, player_chunk_z = int(player.x // 16), int(player.z // 16)
+            for chunk_x, chunk_z in list(self._chunks.keys()):
+                if max(abs(chunk_x - player_chunk_x), abs(chunk_z - player_chunk_z)) > self.radius:
+                    self.remove_chunk(chunk_x, chunk_z)
+                    evicted += 1
+
+        if self.memory_budget is not None:
+            bytes_held = self.bytes_held
+            # The most recent chunk is always kept
+            while bytes_held > self.memory_budget and len(self._chunks) > 1:
+                _chunk = self.remove_chunk(*next(iter(self._chunks)))
+                bytes_held -= self._chunk_nbytes(_chunk)
+                evicted += 1
+
+        self.evictions += evicted
+        return evicted
+
+    def memory_report(self):
+        """
+        Compares the memory held by the decoded sections with the
+        dense uint16 arrays they would take otherwise
+        :return: dict of counters, sizes are in bytes
+        """
+        report = dict(chunks=0, raw_chunks=0, sections=0, compact_bytes=0, dense_bytes=0, raw_bytes=0,
+                      bytes_held=self.bytes_held, evictions=self.evictions)
+
+        for _chunk in list(self._chunks.values()):
+            if type(_chunk) is not Chunk:
+                report['raw_chunks'] += 1
+                report['raw_bytes'] += len(_chunk) if type(_chunk) is bytes else 0
+                continue
+
+            report['chunks'] += 1
+            for index, _section in enumerate(_chunk._sections):
+                if _section is None:
+                    report['raw_bytes'] += len(_chunk.data[index][3])
+                    continue
+
+                report['sections'] += 1
+                report['compact_bytes'] += _section.nbytes
+                report['dense_bytes'] += 4096 * 2
+
+        return report
+
+    def wait_pending_chunks(self, timeout=None):
+        """
+        Waits until every chunk sent to the decoding pool is decoded
+        :param timeout: maximum number of seconds to wait, forever if None
+        :return: True if there are no more chunks being decoded
+        """
+        _, not_done = wait(self.pending_chunks, timeout=timeout)
+        return not not_done
+
+
+def _decode_chunk_packet(buffer: bytes):
+    chunk_data = Chunks.unpack_chunk_data(Buffer1_14(buffer))
+    chunk = Chunk(None, *chunk_data)
+
+    # Also drops the packet bytes of every section before sending the result back
+    sections = [chunk.section(index) for index in range(len(chunk._sections))]
+
+    return chunk_data, sections
+
+
+def reading_chunks(method):
+    """
+    Runs a World method holding the read side of the chunks lock, so it never sees half applied changes
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.chunks.lock.reading():
+            return method(self, *args, **kwargs)
+
+    return wrapper
 
 
 class World:
@@ -855,12 +1908,154 @@ class World:
             if self.time_of_day < ticks:
                 return self._date_state_info[index - 1][1]
 
+    @reading_chunks
     def get_block_state_id(self, x, y, z):
         chunk = self.chunks[x // 16, z // 16]
         if chunk is None:
             return None
 
-        return chunk.blocks[y][z % 16][x % 16]
+        return chunk.get_block(x % 16, y, z % 16)
+
+    @reading_chunks
+    def get_region(self, x0, y0, z0, x1, y1, z1, fill=-1):
+        """
+        Block state ids of the box between two corners, copied one chunk slice at a time
+        :param x0, y0, z0: first corner, included
+        :param x1, y1, z1: opposite corner, included
+        :param fill: value for the blocks in chunks that are not loaded or outside the world height
+        :return: int32 array of shape (dy, dz, dx) indexed as [y][z][x] from the lowest corner
+        """
+        (x0, x1), (y0, y1), (z0, z1) = sorted((int(x0), int(x1))), sorted((int(y0), int(y1))), sorted((int(z0), int(z1)))
+        region = np.full((y1 - y0 + 1, z1 - z0 + 1, x1 - x0 + 1), fill, dtype='int32')
+
+        # Shifts floor negative coordinates into the right chunk (-1 >> 4 == -1, -1 & 15 == 15)
+        for chunk_x in range(x0 >> 4, (x1 >> 4) + 1):
+            for chunk_z in range(z0 >> 4, (z1 >> 4) + 1):
+                chunk = self.chunks[chunk_x, chunk_z]
+                if chunk is None:
+                    continue
+
+                chunk_x0, chunk_x1 = max(x0, chunk_x * 16), min(x1, chunk_x * 16 + 15)
+                chunk_z0, chunk_z1 = max(z0, chunk_z * 16), min(z1, chunk_z * 16 + 15)
+
+                region[:, chunk_z0 - z0:chunk_z1 - z0 + 1, chunk_x0 - x0:chunk_x1 - x0 + 1] = chunk.get_region(
+                    chunk_x0 & 15, y0, chunk_z0 & 15, chunk_x1 & 15, y1, chunk_z1 & 15, fill=fill)
+
+        return region
+
+    @reading_chunks
+    def get_surface_y(self, x, z):
+        """
+        :return: y above the highest motion blocking block of the column, None if its chunk is not loaded
+        """
+        chunk = self.chunks[x >> 4, z >> 4]
+        if chunk is None:
+            return None
+
+        return int(chunk.heights[z & 15, x & 15])
+
+    @reading_chunks
+    def get_surface_ys(self, coords, fill=-1):
+        """
+        Vectorized get_surface_y, only reads the chunk heightmaps
+        :param coords: (N, 2) array of integer x, z world coordinates
+        :param fill: value for the columns in chunks that are not loaded
+        :return: (N,) int32 array of surface y
+        """
+        coords = np.asarray(coords, dtype='int64').reshape((-1, 2))
+        surface_ys = np.full(len(coords), fill, dtype='int32')
+
+        chunk_keys = ((coords[:, 0] >> 4) << 32) | ((coords[:, 1] >> 4) & 0xFFFFFFFF)
+        for chunk_key, positions in _group_by(chunk_keys):
+            chunk = self.chunks[chunk_key >> 32, ((chunk_key & 0xFFFFFFFF) ^ 0x80000000) - 0x80000000]
+            if chunk is None:
+                continue
+
+            surface_ys[positions] = chunk.heights[coords[positions, 1] & 15, coords[positions, 0] & 15]
+
+        return surface_ys
+
+    @reading_chunks
+    def find_blocks(self, block_state_ids, near=None, limit=None):
+        """
+        Positions of the loaded blocks with any of the given states, only the
+        chunk sections listed by the block index for those states are searched
+        :param block_state_ids: block state id or iterable of them
+        :param near: (x, y, z), results are sorted by distance to it
+        :param limit: maximum number of positions returned
+        :return: (N, 3) int64 array of x, y, z world coordinates
+        """
+        self.chunks.enable_block_index()
+        if limit == 0:
+            return np.empty((0, 3), dtype='int64')
+
+        block_state_ids = {block_state_ids} if type(block_state_ids) is int else set(block_state_ids)
+        section_keys = set()
+        for block_state_id in block_state_ids:
+            section_keys.update(self.chunks.block_index.sections_with(block_state_id))
+
+        section_keys = list(section_keys)
+        if near is not None:
+            near = np.asarray(near, dtype='float64')
+            # Section keys are (chunk_x, section_index, chunk_z), the same order as x, y, z
+            corners = np.array(section_keys, dtype='float64').reshape((-1, 3)) * 16
+            distances = np.linalg.norm(np.clip(near, corners, corners + 15) - near, axis=1)
+            order = np.argsort(distances, kind='stable')
+            section_keys, distances = [section_keys[index] for index in order], distances[order]
+
+        found = []
+        found_count = 0
+        for position, (chunk_x, section_index, chunk_z) in enumerate(section_keys):
+            if limit is not None and found_count >= limit:
+                if near is None:
+                    break
+
+                # Sections are visited from the closest one, the rest can't hold anything closer
+                closest = np.partition(np.linalg.norm(np.concatenate(found) - near, axis=1), limit - 1)[limit - 1]
+                if distances[position] > closest:
+                    break
+
+            chunk = self.chunks[chunk_x, chunk_z]
+            if chunk is None:
+                continue
+
+            positions = chunk.find(block_state_ids, section_index)
+            if len(positions):
+                found.append(positions)
+                found_count += len(positions)
+
+        if not found:
+            return np.empty((0, 3), dtype='int64')
+
+        found = np.concatenate(found)
+        if near is not None:
+            found = found[np.argsort(np.linalg.norm(found - near, axis=1), kind='stable')]
+
+        return found[:limit]
+
+    @reading_chunks
+    def get_blocks(self, coords, fill=-1):
+        """
+        Block state ids of many positions at once, coordinates are grouped by
+        chunk and each chunk section is read with a single gather
+        :param coords: (N, 3) array of integer x, y, z world coordinates
+        :param fill: value for the positions in chunks that are not loaded
+        :return: (N,) int32 array of block state ids
+        """
+        coords = np.asarray(coords, dtype='int64').reshape((-1, 3))
+        block_state_ids = np.full(len(coords), fill, dtype='int32')
+
+        # Both chunk coordinates packed in a single int64 key to group them in one pass
+        chunk_keys = ((coords[:, 0] >> 4) << 32) | ((coords[:, 2] >> 4) & 0xFFFFFFFF)
+        for chunk_key, positions in _group_by(chunk_keys):
+            chunk = self.chunks[chunk_key >> 32, ((chunk_key & 0xFFFFFFFF) ^ 0x80000000) - 0x80000000]
+            if chunk is None:
+                continue
+
+            x, y, z = coords[positions].T
+            block_state_ids[positions] = chunk.get_blocks(x & 15, y, z & 15, fill=fill)
+
+        return block_state_ids
 
 
 class Entity:
@@ -969,6 +2164,16 @@ class ConfirmationInformation:
         self.responses = []
         self.debug = False
 
+        # Called with (args, kwargs) by the network thread after every event
+        self.listeners = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
     @property
     def status(self):
         if bool(self.responses):
@@ -995,7 +2200,8 @@ class Confirmations:
         self._confirmations = {}
 
         for method_name in filter(lambda m: m.startswith('_on_'), dir(client)):
-            clear_name = method_name.lstrip('_on_')
+            # Not lstrip, which strips characters: '_on_open_window' would become 'pen_window'
+            clear_name = method_name[len('_on_'):]
             self._confirmations[clear_name] = ConfirmationInformation(clear_name)
             setattr(client, method_name, Confirmations.decorator(getattr(client, method_name), self._confirmations[clear_name]))
 
@@ -1004,7 +2210,13 @@ class Confirmations:
 
         def wrapper(*args, **kwargs):
             sensor.response = (args, kwargs)
-            return func(*args, **kwargs)
+            result = func(*args, **kwargs)
+
+            # Listeners see the event once the client has handled it
+            for listener in list(sensor.listeners):
+                listener(args, kwargs)
+
+            return result
 
         return wrapper
 
@@ -1012,4 +2224,4 @@ class Confirmations:
         if item in self._confirmations:
             return self._confirmations[item]
 
-        raise AttributeError
+        raise AttributeError(f"No event named {item!r}")
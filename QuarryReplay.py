@@ -0,0 +1,173 @@
+from twisted.internet.address import IPv4Address
+from quarry.net.protocol import protocol_modes, protocol_modes_inv
+from MinecraftQuarryClient import MinecraftQuarryClient, MinecraftQuarryClientProtocol
+from typing import NamedTuple
+from threading import Lock
+import struct
+import time
+
+
+MAGIC = b'QPKT\x01'
+
+# A packet name gets an id the first time a recorder writes it: b'N', id, name length, name
+_NAME = struct.Struct('>HB')
+# A packet: b'P', time, protocol version, protocol mode, name id, payload length, payload
+_PACKET = struct.Struct('>dHBHI')
+
+
+class RecordedPacket(NamedTuple):
+    time: float
+    protocol_version: int
+    protocol_mode: str
+    name: str
+    payload: bytes
+
+
+class PacketRecorder:
+    """
+    Appends every packet a client receives to a file, set it as client.packet_recorder.
+    Several recordings can be appended to the same file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.packets = 0
+
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+        self._name_ids = {}
+        self._lock = Lock()
+
+    def record(self, protocol_version, protocol_mode, name, payload):
+        with self._lock:
+            if self._file is None:
+                return
+
+            name_id = self._name_ids.get(name, None)
+            if name_id is None:
+                name_id = self._name_ids[name] = len(self._name_ids)
+                encoded_name = name.encode()
+                self._file.write(b'N' + _NAME.pack(name_id, len(encoded_name)) + encoded_name)
+
+            self._file.write(b'P' + _PACKET.pack(time.time(), protocol_version, protocol_modes_inv[protocol_mode],
+                                                 name_id, len(payload)))
+            self._file.write(payload)
+            self.packets += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_recording(path):
+    """
+    :return: iterator of the RecordedPacket of a recording
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a packet recording")
+
+        names = {}
+        while True:
+            kind = file.read(1)
+            if not kind:
+                return
+
+            if kind == b'N':
+                name_id, length = _NAME.unpack(file.read(_NAME.size))
+                names[name_id] = file.read(length).decode()
+            elif kind == b'P':
+                header = file.read(_PACKET.size)
+                if len(header) < _PACKET.size:
+                    # Cut while recording
+                    return
+                packet_time, protocol_version, protocol_mode, name_id, length = _PACKET.unpack(header)
+                payload = file.read(length)
+                if len(payload) < length:
+                    return
+                yield RecordedPacket(packet_time, protocol_version, protocol_modes[protocol_mode], names[name_id],
+                                     payload)
+            else:
+                raise ValueError(f"Corrupted packet recording {path}")
+
+
+class _NullTransport:
+    """
+    Swallows the packets the handlers answer with
+    """
+
+    def write(self, data):
+        pass
+
+    def loseConnection(self):
+        pass
+
+
+def offline_protocol(client: MinecraftQuarryClient = None, protocol_version=754):
+    """
+    Protocol of a client in play mode without connection, the packets it sends are dropped
+    :param client: client owning the protocol, a new one by default
+    """
+    client = client or MinecraftQuarryClient('replay')
+
+    protocol = client.factory.quarry_protocol = MinecraftQuarryClientProtocol(
+        client.factory, IPv4Address('TCP', '127.0.0.1', 0), quarry_client=client)
+    protocol.ticker.stop()
+    protocol.transport = _NullTransport()
+    protocol.protocol_mode = 'play'
+    protocol.protocol_version = protocol_version
+    protocol.buff_type = client.factory.get_buff_type(protocol_version)
+
+    return protocol
+
+
+def replay(path, client: MinecraftQuarryClient = None, realtime=False, speed=1.0, modes=('play',)):
+    """
+    Feeds a recording through the packet_ handlers of a client without network, the
+    client's world, entities and inventory end up as they were in the recorded session
+    :param client: client receiving the packets, a new one by default
+    :param realtime: wait between the packets as much as they were apart when recorded
+    :param speed: realtime playback speed
+    :param modes: protocol modes of the packets replayed, login packets expect a handshake so they aren't by default
+    :return: dict with the client, the packets replayed, the seconds it took and the seconds spent in each packet name
+    """
+    protocol = offline_protocol(client)
+    client = protocol.quarry_client
+
+    timings = {}
+    replayed = 0
+    first_time = None
+    started = time.perf_counter()
+
+    for packet in read_recording(path):
+        if packet.protocol_mode not in modes:
+            continue
+
+        if packet.protocol_version != protocol.protocol_version:
+            protocol.protocol_version = packet.protocol_version
+            protocol.buff_type = client.factory.get_buff_type(packet.protocol_version)
+
+        if realtime:
+            if first_time is None:
+                first_time = packet.time
+            delay = (packet.time - first_time) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+        packet_started = time.perf_counter()
+        protocol.packet_received(protocol.buff_type(packet.payload), packet.name)
+        timings[packet.name] = timings.get(packet.name, 0.0) + time.perf_counter() - packet_started
+        replayed += 1
+
+    return dict(client=client, packets=replayed, seconds=time.perf_counter() - started,
+                seconds_by_packet=dict(sorted(timings.items(), key=lambda item: -item[1])))
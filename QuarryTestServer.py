@@ -0,0 +1,230 @@
+from twisted.internet import reactor
+from quarry.net.server import ServerFactory, ServerProtocol
+from quarry.types.buffer import Buffer1_14
+from quarry.types.uuid import UUID
+from quarry.types import nbt
+from QuarryPackets import chunk_packet
+from collections import deque
+import argparse
+import random
+import time
+
+
+# Block state ids of 1.16.4 / 1.16.5
+AIR, STONE, GRASS_BLOCK, DIRT, BEDROCK = 0, 1, 9, 10, 33
+SURFACE_Y = 63
+
+
+def flat_chunk_body():
+    """
+    chunk_data packet of a flat chunk without its coordinates: bedrock, stone, dirt and grass up to
+    SURFACE_Y, it's the same for every chunk. It uses the 1.17 layout that Chunks.unpack_chunk_data reads
+    """
+    palette = [AIR, STONE, DIRT, GRASS_BLOCK, BEDROCK]
+
+    def layer(y):
+        if y > SURFACE_Y:
+            return 0
+        if y == 0:
+            return 4
+        if y < SURFACE_Y - 3:
+            return 1
+        return 2 if y < SURFACE_Y else 3
+
+    sections = [(4, palette, [layer(section_y * 16 + y) for y in range(16) for _ in range(256)])
+                for section_y in range(SURFACE_Y // 16 + 1)]
+
+    # Stripped of the chunk_x and chunk_z ints
+    return chunk_packet(0, 0, sections, heights=[SURFACE_Y + 1] * 256)[8:]
+
+
+class TestServerProtocol(ServerProtocol):
+    """
+    A player of the test server, sends it a flat world around the spawn and the load configured in the factory
+    """
+
+    factory: 'TestServerFactory'
+
+    def __init__(self, factory, remote_addr):
+        super().__init__(factory, remote_addr)
+        self.entity_id = None
+        self.position = factory.spawn
+        self.packets_sent = 0
+        # Keep alive round trips in microseconds, they grow when the client can't keep up with the load
+        self.latencies = deque(maxlen=1000)
+        self._entity_ids = []
+
+    def send_packet(self, name, *data):
+        self.packets_sent += 1
+        super().send_packet(name, *data)
+
+    def player_joined(self):
+        super().player_joined()
+        factory, buff_type = self.factory, self.buff_type
+
+        self.entity_id = factory.new_entity_id()
+        empty_compound = nbt.TagRoot({'': nbt.TagCompound({})})
+        self.send_packet('join_game',
+                         buff_type.pack('i?Bb', self.entity_id, False, factory.gamemode, -1) +
+                         buff_type.pack_varint(1) + buff_type.pack_string('minecraft:overworld') +
+                         buff_type.pack_nbt(empty_compound) +
+                         buff_type.pack_nbt(empty_compound) +
+                         buff_type.pack_string('minecraft:overworld') +
+                         buff_type.pack('q', 0) +
+                         buff_type.pack_varint(factory.max_players) +
+                         buff_type.pack_varint(factory.view_distance) +
+                         buff_type.pack('????', False, True, False, True))
+
+        x, y, z = self.position
+        self.send_packet('player_position_and_look',
+                         buff_type.pack('dddff', x, y, z, 0, 0) + buff_type.pack('B', 0) + buff_type.pack_varint(1))
+
+        spawn_chunk_x, spawn_chunk_z = int(x) >> 4, int(z) >> 4
+        for chunk_x in range(spawn_chunk_x - factory.view_distance, spawn_chunk_x + factory.view_distance + 1):
+            for chunk_z in range(spawn_chunk_z - factory.view_distance, spawn_chunk_z + factory.view_distance + 1):
+                self.send_packet('chunk_data', buff_type.pack('ii', chunk_x, chunk_z) + factory.chunk_body)
+
+        for _ in range(factory.entities):
+            entity_id = factory.new_entity_id()
+            self._entity_ids.append(entity_id)
+            self.send_packet('spawn_player',
+                             buff_type.pack_varint(entity_id) + buff_type.pack_uuid(UUID.random()) +
+                             buff_type.pack('dddbb', x + factory.random.uniform(-16, 16), y,
+                                            z + factory.random.uniform(-16, 16), 0, 0))
+
+        self.ticker.add_loop(1, self.tick)
+        self.ticker.add_loop(factory.keep_alive_interval, self.send_keep_alive)
+
+    def tick(self):
+        factory, buff_type, rng = self.factory, self.buff_type, self.factory.random
+
+        if self._entity_ids:
+            for _ in range(factory.entity_moves_per_tick):
+                self.send_packet('entity_relative_move',
+                                 buff_type.pack_varint(rng.choice(self._entity_ids)) +
+                                 buff_type.pack('hhh?', rng.randint(-1024, 1024), 0, rng.randint(-1024, 1024), True))
+
+        if factory.block_changes_per_tick:
+            x, _, z = self.position
+            radius = factory.view_distance * 16
+            for _ in range(factory.block_changes_per_tick):
+                self.send_packet('block_change',
+                                 buff_type.pack_position(int(x) + rng.randint(-radius, radius), SURFACE_Y + 1,
+                                                         int(z) + rng.randint(-radius, radius)) +
+                                 buff_type.pack_varint(rng.choice((AIR, STONE))))
+
+        if factory.time_updates and not self.ticker.tick % 20:
+            self.send_packet('time_update', buff_type.pack('qq', self.ticker.tick, self.ticker.tick % 24000))
+
+    def send_keep_alive(self):
+        # The id is the time it was sent at, the client echoes it back
+        self.send_packet('keep_alive', self.buff_type.pack('q', time.monotonic_ns() // 1000))
+
+    def packet_keep_alive(self, buff):
+        sent = buff.unpack('q')
+        self.latencies.append(time.monotonic_ns() // 1000 - sent)
+
+    def packet_player_position(self, buff):
+        x, y, z, _ = buff.unpack('ddd?')
+        self.position = (x, y, z)
+
+    def packet_player_position_and_look(self, buff):
+        x, y, z, _, _, _ = buff.unpack('dddff?')
+        self.position = (x, y, z)
+
+    def packet_player_digging(self, buff):
+        status = buff.unpack_varint()
+        x, y, z = buff.unpack_position()
+        buff.unpack('b')
+
+        # Creative players break at start, survival ones when they finish
+        if status == (0 if self.factory.gamemode == 1 else 2):
+            self.send_packet('acknowledge_player_digging',
+                             self.buff_type.pack_position(x, y, z) + self.buff_type.pack_varint(AIR) +
+                             self.buff_type.pack_varint(status) + self.buff_type.pack('?', True))
+            self.send_packet('block_change', self.buff_type.pack_position(x, y, z) + self.buff_type.pack_varint(AIR))
+            self.factory.blocks_broken += 1
+
+    def packet_click_window(self, buff):
+        window_id, slot, button, action_number = buff.unpack('Bhbh')
+        buff.discard()
+
+        self.send_packet('confirm_transaction', self.buff_type.pack('bh?', window_id, action_number, True))
+
+    def packet_unhandled(self, buff, name):
+        buff.discard()
+
+
+class TestServerFactory(ServerFactory):
+    """
+    Offline server for integration and load tests, the load is set with the attributes before listening.
+    It only serves this client: the packets are the protocol 754 ones except chunk_data, which has the
+    1.17 layout the client parses, so vanilla clients can't play on it
+    """
+
+    protocol = TestServerProtocol
+    online_mode = False
+    # Packet ids of 1.16.4 / 1.16.5, the server list doesn't show it as a vanilla 1.16.5 server
+    force_protocol_version = 754
+    minecraft_versions = {754: "pyMClient only"}
+    max_players = 1000
+    motd = "pyMClient test server"
+
+    gamemode = 0
+    spawn = (8.5, SURFACE_Y + 1.0, 8.5)
+    # Chunks sent around the spawn
+    view_distance = 2
+    # Players spawned around each client and relative moves sent per tick among them
+    entities = 0
+    entity_moves_per_tick = 0
+    block_changes_per_tick = 0
+    keep_alive_interval = 20
+    time_updates = True
+
+    def __init__(self, seed=0):
+        super().__init__()
+        self.random = random.Random(seed)
+        self.chunk_body = flat_chunk_body()
+        self.blocks_broken = 0
+        self._next_entity_id = 0
+        self._started = time.monotonic()
+
+    def new_entity_id(self):
+        self._next_entity_id += 1
+        return self._next_entity_id
+
+    def stats(self):
+        """
+        :return: dict with the players, the packets sent per second to them and the keep alive latencies in seconds
+        """
+        seconds = time.monotonic() - self._started
+        latencies = sorted(latency for player in self.players for latency in player.latencies)
+
+        return dict(players=len(self.players),
+                    packets_sent_per_second=sum(player.packets_sent for player in self.players) / seconds,
+                    latency_mean=sum(latencies) / len(latencies) / 1e6 if latencies else None,
+                    latency_max=latencies[-1] / 1e6 if latencies else None,
+                    blocks_broken=self.blocks_broken)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline test server for pyMClient bots")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=25565)
+    parser.add_argument('--view-distance', type=int, default=TestServerFactory.view_distance)
+    parser.add_argument('--entities', type=int, default=0)
+    parser.add_argument('--entity-moves', type=int, default=0, help="entity moves sent per tick to each player")
+    parser.add_argument('--block-changes', type=int, default=0, help="block changes sent per tick to each player")
+    args = parser.parse_args()
+
+    factory = TestServerFactory()
+    factory.view_distance = args.view_distance
+    factory.entities = args.entities
+    factory.entity_moves_per_tick = args.entity_moves
+    factory.block_changes_per_tick = args.block_changes
+    factory.listen(args.host, args.port)
+    reactor.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+"""
+Benchmarks of the client hot paths on synthetic inputs, run with `python -m benchmarks`,
+`--output results.json` saves the results and `--compare baseline.json` fails on regressions
+"""
+import tracemalloc
+import timeit
+
+
+def measure(func, number=100, repeat=5):
+    """
+    Times a function and the memory it allocates
+    :param number: calls per timing round
+    :param repeat: timing rounds, the best one is kept
+    :return: dict with the seconds per call and the peak bytes allocated by a single call
+    """
+    seconds = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return dict(seconds=seconds, calls_per_second=1 / seconds, peak_bytes=peak)
@@ -0,0 +1,85 @@
+from benchmarks import chunk_data, packet_handlers, inventory, packet_encoding, concurrency
+import numpy as np
+import argparse
+import platform
+import json
+import time
+import sys
+
+SUITES = {
+    'chunk_data': chunk_data,
+    'packet_handlers': packet_handlers,
+    'inventory': inventory,
+    'packet_encoding': packet_encoding,
+    'concurrency': concurrency,
+}
+
+
+def _format(metric, value):
+    if metric == 'seconds':
+        return f"{value * 1e6:>12.2f} us"
+    if metric.endswith('_per_second'):
+        return f"{value:>12.0f} {metric[:-len('_per_second')]}/s"
+    return f"{value:>12} {metric}" if isinstance(value, int) else f"{value:>12.4g} {metric}"
+
+
+def compare(results, baseline, threshold):
+    """
+    :param threshold: ratio over which a slower result is a regression
+    :return: list of (suite, name, metric, ratio) of the regressions, ratio > 1 is slower than the baseline
+    """
+    regressions = []
+    for suite, suite_results in results.items():
+        for name, result in suite_results.items():
+            baseline_result = baseline.get(suite, {}).get(name)
+            if baseline_result is None:
+                continue
+
+            # calls_per_second is derived from seconds, rates are compared for the results without a time
+            metrics = ['seconds'] if 'seconds' in result else [metric for metric in result
+                                                               if metric.endswith('_per_second')]
+            for metric in metrics:
+                value, baseline_value = result[metric], baseline_result.get(metric)
+                if not baseline_value or not value:
+                    continue
+                ratio = value / baseline_value if metric == 'seconds' else baseline_value / value
+
+                print(f"{suite + '.' + name:<70} {metric:<30} {ratio:>6.2f}x{'  REGRESSION' if ratio > threshold else ''}")
+                if ratio > threshold:
+                    regressions.append((suite, name, metric, ratio))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Benchmarks of the client hot paths")
+    parser.add_argument('--only', nargs='+', choices=SUITES, default=list(SUITES), help="suites to run")
+    parser.add_argument('--output', help="JSON file the results are saved to")
+    parser.add_argument('--compare', help="JSON results of a previous run to compare with")
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help="slowdown ratio over the compared run that fails, 1.2 by default")
+    args = parser.parse_args()
+
+    results = {}
+    for suite in args.only:
+        results[suite] = SUITES[suite].run()
+        for name, result in results[suite].items():
+            print(f"{name:<60} " + ' '.join(_format(metric, value) for metric, value in result.items()))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(dict(meta=dict(python=platform.python_version(), numpy=np.__version__,
+                                     platform=platform.platform(), time=time.time()),
+                           results=results), file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions over {args.threshold}x", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+from quarry.types.buffer import Buffer1_14
+from QuarryPlayer import Chunks, Chunk
+from benchmarks import measure
+from benchmarks.synthetic import random_chunk_packet
+
+
+def run(number=50, bits_per_block_values=range(4, 16)):
+    results = {}
+
+    for bits_per_block in bits_per_block_values:
+        packet = random_chunk_packet(0, 0, bits_per_block=bits_per_block)
+        results[f'unpack_chunk_data[bits_per_block={bits_per_block}]'] = measure(
+            lambda: Chunks.unpack_chunk_data(Buffer1_14(packet)), number=number)
+
+    for bits_per_block in bits_per_block_values:
+        # A new chunk each call, the blocks of a chunk are only computed once and it drops the decoded sections data
+        chunk_x, chunk_z, primary_bit_mask, height_maps, biomes, data, block_entities = Chunks.unpack_chunk_data(
+            Buffer1_14(random_chunk_packet(0, 0, bits_per_block=bits_per_block)))
+        results[f'_compute_data_to_blocks[bits_per_block={bits_per_block}]'] = measure(
+            lambda: Chunk(None, chunk_x, chunk_z, primary_bit_mask, height_maps, biomes, list(data),
+                          block_entities)._compute_data_to_blocks(), number=number)
+
+    return results
@@ -0,0 +1,72 @@
+"""
+Reader threads querying a World while a writer thread applies block changes
+and resends chunks, the way the reactor thread does while bots read it
+"""
+from threading import Thread, Event
+from QuarryPlayer import World
+from benchmarks.synthetic import random_chunk_packet
+import numpy as np
+import time
+
+
+def _world(size):
+    world = World(None)
+    for chunk_x in range(size):
+        for chunk_z in range(size):
+            world.chunks.new_chunk_data(random_chunk_packet(chunk_x, chunk_z, sections=8, seed=chunk_x * size + chunk_z))
+
+    return world
+
+
+def run(readers=(1, 2, 4, 8), duration=1.0, size=4, batch=256):
+    """
+    :param readers: numbers of reader threads to try
+    :param duration: seconds each configuration runs
+    :param size: the world is size x size chunks
+    :param batch: positions read by each get_blocks call
+    :return: dict of reads (get_blocks calls) and writes per second for each number of readers
+    """
+    results = {}
+
+    for reader_count in readers:
+        world = _world(size)
+        packets = [random_chunk_packet(chunk_x, 0, sections=8, seed=100 + chunk_x) for chunk_x in range(size)]
+        stop = Event()
+        reads, writes = [0] * reader_count, [0]
+
+        def read(index):
+            rng = np.random.default_rng(index)
+            coords = np.column_stack([rng.integers(0, size * 16, batch),
+                                      rng.integers(0, 128, batch),
+                                      rng.integers(0, size * 16, batch)])
+            while not stop.is_set():
+                world.get_blocks(coords)
+                world.get_block_state_id(*coords[reads[index] % batch].tolist())
+                reads[index] += 1
+
+        def write():
+            rng = np.random.default_rng(-1 % 2 ** 32)
+            while not stop.is_set():
+                x, y, z = rng.integers(0, size * 16), rng.integers(0, 128), rng.integers(0, size * 16)
+                world.chunks.new_block_change(int(x), int(y), int(z), int(rng.integers(1, 1000)))
+                if not writes[0] % 64:
+                    # Resent chunks are decoded again by the first reader that needs them
+                    world.chunks.new_chunk_data(packets[writes[0] // 64 % size])
+                writes[0] += 1
+                # The network thread spends most of its time waiting for packets
+                time.sleep(0.0001)
+
+        threads = [Thread(target=read, args=(index,)) for index in range(reader_count)] + [Thread(target=write)]
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        results[f'concurrency[readers={reader_count}]'] = dict(
+            reads_per_second=sum(reads) / duration,
+            reads_per_second_per_reader=sum(reads) / duration / reader_count,
+            writes_per_second=writes[0] / duration)
+
+    return results
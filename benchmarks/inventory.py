@@ -0,0 +1,15 @@
+from QuarryPlayer import SlotsArray
+from benchmarks import measure
+
+
+def run(number=20000):
+    slots = SlotsArray(46)
+    item = {'item': 1, 'count': 32}
+    slots[36] = item
+
+    return {
+        'SlotsArray.__getitem__': measure(lambda: slots[36], number=number),
+        'SlotsArray.__getitem__[empty]': measure(lambda: slots[0], number=number),
+        'SlotsArray.__setitem__': measure(lambda: slots.__setitem__(37, item), number=number),
+        'SlotsArray.__setitem__[bytes]': measure(lambda: slots.__setitem__(38, b'\x00'), number=number),
+    }
@@ -0,0 +1,86 @@
+from quarry.types.buffer import Buffer1_14
+from quarry.data import packets
+from QuarryPackets import PacketEncoder
+from benchmarks import measure
+
+PROTOCOL_VERSION = 754
+
+
+def _buffer_frame(name, payload, compression_threshold=-1):
+    # What quarry's Protocol.send_packet does with a payload
+    ident = packets.packet_idents[(PROTOCOL_VERSION, 'play', 'upstream', name)]
+    return Buffer1_14.pack_packet(Buffer1_14.pack_varint(ident) + payload, compression_threshold)
+
+
+def _buffer_player_position():
+    buff = Buffer1_14()
+    buff.add(buff.pack('dddB', 100.5, 64.0, -200.5, True))
+    return _buffer_frame('player_position', buff.read())
+
+
+def _buffer_player_digging():
+    buff = Buffer1_14()
+    buff.add(buff.pack_varint(0))
+    buff.add(buff.pack_position(100, 64, -200))
+    buff.add(buff.pack('B', 1))
+    return _buffer_frame('player_digging', buff.read())
+
+
+def _buffer_player_block_placement():
+    buff = Buffer1_14()
+    buff.add(
+        buff.pack_varint(0) +
+        buff.pack_position(100, 64, -200) +
+        buff.pack_varint(1) +
+        buff.pack('fff', 0.5, 1.0, 0.5) +
+        buff.pack('?', False))
+    return _buffer_frame('player_block_placement', buff.read())
+
+
+def _buffer_click_window():
+    buff = Buffer1_14()
+    buff.add(
+        buff.pack('B', 0) +
+        buff.pack('h', 36) +
+        buff.pack('b', 0) +
+        buff.pack('h', 1) +
+        buff.pack_varint(0))
+    buff.add(buff.pack_slot(item=None))
+    return _buffer_frame('click_window', buff.read())
+
+
+def _buffer_chat_message():
+    buff = Buffer1_14()
+    buff.add(buff.pack_string("hello world"))
+    return _buffer_frame('chat_message', buff.read())
+
+
+def run(number=10000):
+    encoder = PacketEncoder.get(PROTOCOL_VERSION)
+
+    cases = {
+        'player_position': (
+            _buffer_player_position,
+            lambda: encoder.frame('player_position', encoder.player_position(100.5, 64.0, -200.5, True))),
+        'player_digging': (
+            _buffer_player_digging,
+            lambda: encoder.frame('player_digging', encoder.player_digging(0, 100, 64, -200, 1))),
+        'player_block_placement': (
+            _buffer_player_block_placement,
+            lambda: encoder.frame('player_block_placement',
+                                  encoder.player_block_placement(0, 100, 64, -200, 1, 0.5, 1.0, 0.5, False))),
+        'click_window': (
+            _buffer_click_window,
+            lambda: encoder.frame('click_window', encoder.click_window(0, 36, 0, 0, 1, 1, {'item': None}))),
+        'chat_message': (
+            _buffer_chat_message,
+            lambda: encoder.frame('chat_message', encoder.string("hello world"))),
+    }
+
+    results = {}
+    for name, (buffer_encode, struct_encode) in cases.items():
+        assert buffer_encode() == struct_encode(), name
+        results[f'{name}[Buffer1_14]'] = measure(buffer_encode, number=number)
+        results[f'{name}[PacketEncoder]'] = measure(struct_encode, number=number)
+
+    return results
@@ -0,0 +1,58 @@
+"""
+Packet handlers of a client without network, fed synthetic packets the way the reactor thread does
+"""
+from quarry.types.buffer import Buffer1_14
+from quarry.types.uuid import UUID
+from QuarryReplay import offline_protocol
+from QuarryPackets import multi_block_change_packet
+from benchmarks import measure
+from benchmarks.synthetic import random_chunk_packet
+import numpy as np
+
+
+def _protocol(sections=8):
+    protocol = offline_protocol()
+    protocol.quarry_client.world.chunks.new_chunk_data(random_chunk_packet(0, 0, sections=sections))
+    return protocol
+
+
+def run(number=1000, records_values=(64, 4096), entities=100):
+    """
+    :param records_values: sizes of the multi_block_change packets
+    :param entities: players visible to the client, the moves are spread among them
+    """
+    results = {}
+    protocol = _protocol()
+    client = protocol.quarry_client
+    rng = np.random.default_rng(0)
+
+    for records in records_values:
+        blocks = np.column_stack([rng.integers(1, 20000, records), rng.integers(0, 16, (records, 3))])
+        packet = multi_block_change_packet(0, 2, 0, blocks)
+        results[f'packet_multi_block_change[records={records}]'] = measure(
+            lambda: protocol.packet_multi_block_change(Buffer1_14(packet)), number=max(number // records * 16, 10))
+
+    for entity_id in range(entities):
+        client._on_visible_player(entity_id, UUID.random(), 8.0, 80.0, 8.0, 0, 0)
+
+    moves = iter(range(1 << 62))
+    results[f'_on_entity_position_and_rotation[entities={entities}]'] = measure(
+        lambda: client._on_entity_position_and_rotation(next(moves) % entities, 4096, 0, -4096, 64, 0, True),
+        number=number * 10)
+
+    packets = [Buffer1_14.pack_varint(entity_id) + Buffer1_14.pack('hhhbb?', 4096, 0, -4096, 64, 0, True)
+               for entity_id in range(entities)]
+    results[f'packet_entity_look_and_relative_move[entities={entities}]'] = measure(
+        lambda: protocol.packet_entity_look_and_relative_move(Buffer1_14(packets[next(moves) % entities])),
+        number=number * 10)
+
+    # Confirmations wrap every _on_ method of the client
+    unwrapped = type(client)._on_plugin_message.__get__(client)
+    results['_on_plugin_message[unwrapped]'] = measure(lambda: unwrapped('minecraft:brand', b''), number=number * 10)
+    results['_on_plugin_message[Confirmations]'] = measure(
+        lambda: client._on_plugin_message('minecraft:brand', b''), number=number * 10)
+    client.confirmations.plugin_message.listeners.append(lambda args, kwargs: None)
+    results['_on_plugin_message[Confirmations, 1 listener]'] = measure(
+        lambda: client._on_plugin_message('minecraft:brand', b''), number=number * 10)
+
+    return results
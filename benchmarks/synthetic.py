@@ -0,0 +1,21 @@
+"""
+Random chunk packets for the benchmarks and tests, the packets themselves are built by QuarryPackets
+"""
+from QuarryPackets import chunk_packet
+import numpy as np
+
+
+def random_section(bits_per_block, rng: np.random.Generator):
+    """
+    :return: (bits_per_block, palette, indices), the palette is empty for the global palette
+    """
+    if bits_per_block > 8:
+        return bits_per_block, [], rng.integers(0, 1 << bits_per_block, 4096)
+
+    palette = rng.choice(np.arange(1, 20000), size=1 << bits_per_block, replace=False).tolist()
+    return bits_per_block, palette, rng.integers(0, len(palette), 4096)
+
+
+def random_chunk_packet(chunk_x, chunk_z, bits_per_block=4, sections=16, seed=0):
+    rng = np.random.default_rng(seed)
+    return chunk_packet(chunk_x, chunk_z, [random_section(bits_per_block, rng) for _ in range(sections)])
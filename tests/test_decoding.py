@@ -0,0 +1,121 @@
+"""
+Round trips of the synthetic packets of the benchmarks through the chunk and multi block change decoders
+"""
+from quarry.types.buffer import Buffer1_14
+from QuarryPlayer import Chunks, Chunk, ChunkSection, World, unpack_varints
+from QuarryReplay import offline_protocol
+from QuarryPackets import chunk_packet, multi_block_change_packet
+from benchmarks.synthetic import random_section
+import numpy as np
+import pytest
+
+
+def _expected_blocks(section):
+    bits_per_block, palette, indices = section
+    indices = np.asarray(indices)
+    values = np.asarray(palette)[indices] if palette else indices
+    return values.reshape((16, 16, 16))
+
+
+@pytest.mark.parametrize('bits_per_block', range(4, 16))
+def test_chunk_sections(bits_per_block):
+    rng = np.random.default_rng(bits_per_block)
+    sections = [random_section(bits_per_block, rng) for _ in range(4)]
+    # A missing section in the mask is read as air
+    sections.insert(2, None)
+
+    chunk_data = Chunks.unpack_chunk_data(Buffer1_14(chunk_packet(-3, 7, sections)))
+    assert chunk_data[:2] == (-3, 7)
+
+    chunk = Chunk(None, *chunk_data)
+    for index, section in enumerate(sections):
+        blocks = chunk.blocks[index * 16:index * 16 + 16]
+        if section is None:
+            assert not blocks.any()
+        else:
+            assert np.array_equal(blocks, _expected_blocks(section))
+
+    # Sections decoded one at a time give the same blocks as the whole chunk
+    lazy_chunk = Chunk(None, *Chunks.unpack_chunk_data(Buffer1_14(chunk_packet(-3, 7, sections))))
+    y, z, x = 16 + np.arange(4096) // 256, np.arange(4096) // 16 % 16, np.arange(4096) % 16
+    assert np.array_equal(lazy_chunk.get_blocks(x, y, z), chunk.blocks[16:32].ravel())
+
+
+def test_unpack_varints():
+    values = [0, 1, 127, 128, 255, 300, 16383, 16384, 2 ** 21, 2 ** 31 - 1, 2 ** 35, 2 ** 63 - 1]
+    data = b'\xff' + b''.join(Buffer1_14.pack_varint(value, max_bits=64) for value in values)
+
+    unpacked, pos = unpack_varints(data, 1, len(values), max_bytes=10)
+    assert unpacked == values
+    assert pos == len(data)
+
+    # Single byte run
+    assert unpack_varints(bytes(range(100)), 10, 50) == (list(range(10, 60)), 60)
+
+
+@pytest.mark.parametrize('records', [1, 64, 4096])
+@pytest.mark.parametrize('chunk_x, chunk_y, chunk_z', [(0, 2, 0), (-5, 0, 3), (200000, 7, -200000)])
+def test_multi_block_change(records, chunk_x, chunk_y, chunk_z):
+    protocol = offline_protocol()
+    world: World = protocol.quarry_client.world
+    world.chunks.new_chunk_data(chunk_packet(chunk_x, chunk_z, [random_section(4, np.random.default_rng(0))] * 8))
+
+    rng = np.random.default_rng(records)
+    blocks = np.column_stack([rng.integers(1, 20000, records), rng.integers(0, 16, (records, 3))])
+    protocol.packet_multi_block_change(Buffer1_14(multi_block_change_packet(chunk_x, chunk_y, chunk_z, blocks)))
+
+    # The last change of a block wins
+    expected = {}
+    for block_state_id, x, y, z in blocks.tolist():
+        expected[(chunk_x * 16 + x, chunk_y * 16 + y, chunk_z * 16 + z)] = block_state_id
+
+    coords = np.array(list(expected))
+    assert world.get_blocks(coords).tolist() == list(expected.values())
+
+
+def test_section_palette_compaction():
+    # A full 8 bit palette that only uses 16 entries is compacted to 4 bits before the new entry is added
+    section = ChunkSection(list(range(1000, 1256)), np.arange(4096) % 16)
+    section.set(0, 7777)
+
+    assert section.get(0) == 7777
+    assert section.get_many(np.arange(1, 4096)).tolist() == (1000 + np.arange(1, 4096) % 16).tolist()
+    assert len(section.palette) <= {4: 16, 8: 256}.get(section.bits, len(section.palette))
+
+
+def test_section_set_many_rebuild():
+    section = ChunkSection(list(range(1000, 1016)), np.arange(4096) % 16)
+    expected = section.to_array().ravel()
+
+    indices = np.arange(0, 4096, 7)
+    block_state_ids = 2000 + np.arange(len(indices))
+    section.set_many(indices, block_state_ids)
+    expected[indices] = block_state_ids
+    assert np.array_equal(section.to_array().ravel(), expected)
+
+    # Overwriting every block of a full palette with a new state leaves a single valued section
+    section = ChunkSection(list(range(1000, 1016)), np.arange(4096) % 16)
+    section.set_many(np.arange(4096), np.full(4096, 3))
+    assert section.single_value == 3
+    section.set(5, 4)
+    assert section.get(5) == 4 and section.get(6) == 3
+
+
+@pytest.mark.parametrize('near', [None, (20, 40, -3)])
+def test_find_blocks_limits(near):
+    world = World(None)
+    world.chunks.new_chunk_data(chunk_packet(1, -1, [None] * 4))
+    world.chunks[1, -1].set_blocks([5, 12, 15], [16, 17, 47], [0, 2, 15], [42, 42, 42])
+
+    assert world.find_blocks(42, near=near, limit=0).shape == (0, 3)
+
+    # A limit over the number of matches returns them all
+    found = world.find_blocks(42, near=near, limit=10)
+    assert sorted(map(tuple, found.tolist())) == [(21, 16, -16), (28, 17, -14), (31, 47, -1)]
+
+    found = world.find_blocks(42, near=near, limit=2)
+    assert len(found) == 2
+    if near is not None:
+        assert found.tolist() == [[31, 47, -1], [28, 17, -14]]
+
+    assert world.find_blocks(43, near=near, limit=10).shape == (0, 3)
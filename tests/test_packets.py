@@ -0,0 +1,31 @@
+"""
+PacketEncoder payloads against the ones quarry's Buffer1_14 builds
+"""
+from quarry.types.buffer import Buffer1_14
+from QuarryPackets import PacketEncoder
+import pytest
+
+encoder = PacketEncoder.get(754)
+
+
+@pytest.mark.parametrize('status', [0, 2, 6, 127, 128, 300, -1])
+@pytest.mark.parametrize('face', [0, 1, 5, 255])
+def test_player_digging(status, face):
+    expected = Buffer1_14.pack_varint(status) + Buffer1_14.pack_position(100, 64, -200) + Buffer1_14.pack('B', face)
+    assert encoder.player_digging(status, 100, 64, -200, face) == expected
+
+
+@pytest.mark.parametrize('hand', [0, 1, 128, -1])
+@pytest.mark.parametrize('face', [0, 5, 200, 70000])
+def test_player_block_placement(hand, face):
+    expected = (Buffer1_14.pack_varint(hand) + Buffer1_14.pack_position(-3, 0, 7) + Buffer1_14.pack_varint(face) +
+                Buffer1_14.pack('fff?', 0.5, 1.0, 0.25, True))
+    assert encoder.player_block_placement(hand, -3, 0, 7, face, 0.5, 1.0, 0.25, True) == expected
+
+
+def test_frame():
+    payload = encoder.player_digging(2, 1, 2, 3, 1)
+    ident = encoder.packet_ids['player_digging']
+    for compression_threshold in (-1, 0, 256):
+        assert encoder.frame('player_digging', payload, compression_threshold) == \
+            Buffer1_14.pack_packet(ident + payload, compression_threshold)
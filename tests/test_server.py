@@ -0,0 +1,55 @@
+"""
+A client joining the offline test server over a real connection
+"""
+from twisted.internet import reactor
+from twisted.internet.threads import blockingCallFromThread
+from QuarryTestServer import SURFACE_Y, GRASS_BLOCK, DIRT, AIR
+import QuarryTestServer
+import MinecraftQuarryClient
+import pytest
+import time
+
+
+def _wait(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture(scope='module')
+def server():
+    MinecraftQuarryClient.start_reactor()
+    # Imported through the module, pytest would try to collect the Test* classes
+    factory = QuarryTestServer.TestServerFactory()
+    port = blockingCallFromThread(reactor, reactor.listenTCP, 0, factory, interface='127.0.0.1')
+
+    yield factory, port.getHost().port
+
+    blockingCallFromThread(reactor, port.stopListening)
+    # The reactor thread isn't a daemon one, pytest would wait for it forever
+    reactor.callFromThread(reactor.stop)
+    MinecraftQuarryClient._reactor_thread.join(5)
+
+
+def test_join_and_break_block(server):
+    factory, port = server
+    client = MinecraftQuarryClient.MinecraftQuarryClient('tester')
+    client.factory.force_protocol_version = 754
+    client.join_server('127.0.0.1', port, timeout=10)
+
+    try:
+        world = client.world
+        # Every chunk in the view distance around the spawn is sent
+        assert _wait(lambda: len(world.chunks._chunks) == (2 * factory.view_distance + 1) ** 2)
+        assert world.get_block_state_id(4, SURFACE_Y, 4) == GRASS_BLOCK
+        assert world.get_block_state_id(4, SURFACE_Y - 1, 4) == DIRT
+        assert world.get_block_state_id(4, SURFACE_Y + 1, 4) == AIR
+
+        client.break_block(4, SURFACE_Y, 4)
+        assert _wait(lambda: world.get_block_state_id(4, SURFACE_Y, 4) == AIR)
+        assert factory.blocks_broken == 1
+    finally:
+        client.disconnect()